@@ -0,0 +1,278 @@
+"""
+Benchmark the predict.py scorers, model backends and form flow.
+
+Each case is timed call by call for --repeat runs of at least --min-time
+seconds each. Every run reports its mean latency, p50/p99, calls/s and
+rows/s, and each case also gets a summary over the runs (median of the run
+means). The results are written as JSON with the versions and host they
+were measured on, plus the process RSS after each case, so runs can be
+compared between releases. Inputs are drawn from a seeded generator (uniform
+over the form ranges, or realistic applicants from synth_applicants.py with
+--synthetic) and the rule scorers run in hashed jitter mode, so every run
+scores the same rows. Run this from the model directory:
+
+    python bench.py [--output bench.json] [--filter rules.] [--repeat 5]
+
+Cases whose backend is not available (no kidney_model.joblib, no heart
+model) are reported as skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# The benchmark writes JSON to stdout; keep the app's structured log out of it
+os.environ.setdefault('CARDIALINK_LOG_FILE', os.devnull)
+
+import predict
+
+BENCH_FORMAT = 1
+
+# Rows per call for the batched cases
+BATCH_ROWS = 10000
+
+
+class SkipBenchmark(Exception):
+    """Raised by a case's setup when the backend it measures is not available."""
+
+
+def random_rows(rng, n):
+    """(heart, kidney, diabetes) feature matrices with n rows in the ranges the forms accept."""
+    heart = np.column_stack([
+        rng.integers(29, 78, n), rng.integers(0, 2, n), rng.integers(0, 4, n),
+        rng.integers(94, 201, n), rng.integers(126, 565, n), rng.integers(0, 2, n),
+        rng.integers(0, 3, n), rng.integers(71, 203, n), rng.integers(0, 2, n),
+        rng.uniform(0, 6.2, n).round(1), rng.integers(0, 3, n), rng.integers(0, 5, n),
+        rng.integers(0, 4, n),
+    ]).astype(np.float64)
+    kidney = np.column_stack([
+        rng.integers(18, 90, n), rng.integers(50, 180, n),
+        rng.choice([1.005, 1.010, 1.015, 1.020, 1.025], n), rng.integers(0, 6, n),
+        rng.integers(0, 6, n), rng.integers(0, 2, n), rng.integers(0, 2, n),
+        rng.integers(0, 2, n), rng.integers(0, 2, n), rng.integers(22, 490, n),
+        rng.integers(1, 391, n), rng.uniform(0.4, 15, n).round(1),
+    ]).astype(np.float64)
+    diabetes = np.column_stack([rng.integers(16, 90, n)] + [rng.integers(0, 2, n) for _ in range(11)]).astype(np.float64)
+    return heart, kidney, diabetes
+
+
+def cycle(rows):
+    """Endless iterator over the rows of a matrix as Python lists (what the routes pass in)."""
+    rows = rows.tolist()
+    while True:
+        yield from rows
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is not available)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def time_calls(fn, min_time, min_calls=10, max_calls=1000000):
+    """Call fn repeatedly for at least min_time seconds; return the per-call latencies in seconds."""
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < max_calls and (len(samples) < min_calls or time.perf_counter() < deadline):
+        started = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - started)
+    return np.array(samples, dtype=np.float64) / 1e9
+
+
+def summarize_run(samples, rows_per_call):
+    total = samples.sum()
+    return {
+        'calls': int(len(samples)),
+        'mean_us': float(samples.mean() * 1e6),
+        'p50_us': float(np.percentile(samples, 50) * 1e6),
+        'p99_us': float(np.percentile(samples, 99) * 1e6),
+        'min_us': float(samples.min() * 1e6),
+        'ops_per_sec': float(len(samples) / total),
+        'rows_per_sec': float(len(samples) * rows_per_call / total),
+    }
+
+
+def run_case(name, setup, repeat, min_time):
+    """Set up one case and time it repeat times. setup() returns (fn, rows_per_call)."""
+    try:
+        fn, rows_per_call = setup()
+    except SkipBenchmark as e:
+        return {'name': name, 'skipped': str(e)}
+    # Warm up caches, lazy model loading and any first-call allocation
+    time_calls(fn, min(min_time, 0.05), min_calls=3)
+    runs = [summarize_run(time_calls(fn, min_time), rows_per_call) for _ in range(repeat)]
+    means = [run['mean_us'] for run in runs]
+    return {
+        'name': name,
+        'rows_per_call': rows_per_call,
+        'runs': runs,
+        'median_mean_us': float(np.median(means)),
+        'p50_us': float(np.median([run['p50_us'] for run in runs])),
+        'p99_us': float(np.median([run['p99_us'] for run in runs])),
+        'ops_per_sec': float(np.median([run['ops_per_sec'] for run in runs])),
+        'rows_per_sec': float(np.median([run['rows_per_sec'] for run in runs])),
+        'rss_mb': rss_mb(),
+    }
+
+
+def build_cases(seed, synthetic=False):
+    """Return [(name, setup), ...] for every benchmark case."""
+    rng = np.random.default_rng(seed)
+    heart_X, kidney_X, diabetes_X = random_rows(rng, BATCH_ROWS)
+    if synthetic:
+        import synth_applicants
+        heart_X, kidney_X, diabetes_X = synth_applicants.applicant_matrices(BATCH_ROWS, seed)
+    model_columns = [predict.KIDNEY_FEATURE_NAMES.index(name) for name in predict.KIDNEY_MODEL_FEATURES]
+    risks = rng.uniform(0, 1, BATCH_ROWS)
+    cases = []
+
+    def scalar_case(scalar_fn, X):
+        rows = cycle(X)
+        return lambda: (lambda: scalar_fn(next(rows)), 1)
+
+    def batch_case(batch_fn, X):
+        return lambda: (lambda: batch_fn(X), len(X))
+
+    for disease, X in (('heart', heart_X), ('kidney', kidney_X), ('diabetes', diabetes_X)):
+        cases.append((f'rules.{disease}.scalar',
+                      scalar_case(getattr(predict, f'calculate_rule_based_{disease}_risk'), X)))
+        cases.append((f'rules.{disease}.batch',
+                      batch_case(getattr(predict, f'calculate_rule_based_{disease}_risk_batch'), X)))
+
+    def kidney_model_case(rows):
+        def setup():
+            model = predict.model_registry.get('kidney')
+            if model is None:
+                raise SkipBenchmark(f"kidney model not loaded ({predict.model_registry.status()['kidney']['state']})")
+            X = np.ascontiguousarray(kidney_X[:rows][:, model_columns])
+            if rows == 1:
+                single = cycle(kidney_X[:, model_columns])
+                return (lambda: model.predict_proba([next(single)])), 1
+            return (lambda: model.predict_proba(X)), rows
+        return setup
+
+    cases.append(('model.kidney.predict_proba.single', kidney_model_case(1)))
+    cases.append(('model.kidney.predict_proba.batch', kidney_model_case(BATCH_ROWS)))
+
+    def heart_model_case(rows):
+        def setup():
+            model = predict.model_registry.get('heart')
+            if model is None:
+                raise SkipBenchmark(f"heart model not loaded ({predict.model_registry.status()['heart']['state']})")
+            X = heart_X[:rows]
+            return (lambda: model.predict_proba(X)), rows
+        return setup
+
+    cases.append(('model.heart.predict_proba.single', heart_model_case(1)))
+    cases.append(('model.heart.predict_proba.batch', heart_model_case(BATCH_ROWS)))
+
+    premium_risks = cycle(risks)
+    cases.append(('premium.scalar', lambda: ((lambda: predict.calculate_insurance_premium(next(premium_risks))), 1)))
+    cases.append(('premium.batch', lambda: ((lambda: predict.calculate_insurance_premium_batch(risks)), len(risks))))
+
+    cases.append(('score_applicants.batch', lambda: (
+        (lambda: predict.score_applicants_batch(heart_X, kidney_X, diabetes_X)), BATCH_ROWS)))
+
+    def flow_setup():
+        client = predict.app.test_client()
+        forms = cycle(np.arange(BATCH_ROWS).reshape(-1, 1))
+        names = {
+            'heart': predict.HEART_FEATURE_NAMES,
+            'kidney': predict.KIDNEY_FEATURE_NAMES,
+            'diabetes': predict.DIABETES_FEATURE_NAMES,
+        }
+        matrices = {'heart': heart_X, 'kidney': kidney_X, 'diabetes': diabetes_X}
+
+        def flow():
+            i = next(forms)[0]
+            for disease in ('heart', 'kidney', 'diabetes'):
+                form = {name: str(value) for name, value in zip(names[disease], matrices[disease][i])}
+                response = client.post(f'/{disease}', data=form)
+                if response.status_code != 302:
+                    raise RuntimeError(f"/{disease} returned {response.status_code}")
+            response = client.get('/results')
+            if response.status_code != 200:
+                raise RuntimeError(f"/results returned {response.status_code}")
+        return flow, 1
+
+    cases.append(('flow.end_to_end', flow_setup))
+    cases.append(('flow.form_page', lambda: ((lambda: predict.app.test_client().get('/kidney')), 1)))
+    return cases
+
+
+def environment():
+    """Versions and host details stored with the results."""
+    import sklearn
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': commit,
+    }
+
+
+def run_benchmarks(filters=None, repeat=3, min_time=0.2, seed=0, synthetic=False):
+    """Run every case whose name contains one of the filters (all cases by default)."""
+    predict.set_jitter_mode('hashed')
+    results = []
+    for name, setup in build_cases(seed, synthetic):
+        if filters and not any(f in name for f in filters):
+            continue
+        result = run_case(name, setup, repeat, min_time)
+        results.append(result)
+        if 'skipped' in result:
+            print(f"{name:40s} skipped: {result['skipped']}", file=sys.stderr)
+        else:
+            print(f"{name:40s} {result['median_mean_us']:12.1f} us/call {result['rows_per_sec']:14,.0f} rows/s",
+                  file=sys.stderr)
+    return {
+        'format': BENCH_FORMAT,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'settings': {'repeat': repeat, 'min_time': min_time, 'seed': seed, 'batch_rows': BATCH_ROWS,
+                     'synthetic': synthetic},
+        'environment': environment(),
+        'peak_rss_mb': peak_rss_mb(),
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    parser.add_argument('--filter', action='append', help='only run cases whose name contains this (repeatable)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds per timed run')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the generated inputs')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='score applicants from synth_applicants.py instead of uniformly random form values')
+    args = parser.parse_args()
+    report = run_benchmarks(args.filter, args.repeat, args.min_time, args.seed, args.synthetic)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
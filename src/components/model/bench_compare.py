@@ -0,0 +1,176 @@
+"""
+Compare a fresh benchmark run with a stored baseline and fail on regressions.
+
+The baseline is a JSON file written by bench.py. Each case is compared on
+the median of its run means, which a single slow run cannot move. A case
+counts as regressed when it is slower than the baseline by more than its
+threshold: --threshold (10% by default), widened to --noise-factor times the
+run-to-run spread measured in either file, so noisy cases need a larger
+slowdown before they fail the build. Run this from the model directory:
+
+    python bench_compare.py bench-baseline.json [--current bench.json] [--threshold 0.1]
+
+Without --current the benchmarks are run now with the baseline's settings.
+A table of every case is printed. The exit status is 1 if any case
+regressed, 2 if none regressed but a case that ran in the baseline was
+skipped or is missing now (a model that is not available, a case removed
+from bench.py), and 0 otherwise. Pass --allow-skipped when a case is
+dropped on purpose.
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+# Exit status when a case regressed
+EXIT_REGRESSION = 1
+# Exit status when a case that ran in the baseline was skipped or is missing now
+EXIT_NOT_RUN = 2
+
+
+def load_report(path):
+    with open(path, 'r') as f:
+        report = json.load(f)
+    if not isinstance(report.get('results'), list):
+        raise ValueError(f"{path} is not a bench.py report")
+    return report
+
+
+def run_means(result):
+    return np.array([run['mean_us'] for run in result.get('runs', [])], dtype=np.float64)
+
+
+def relative_spread(result):
+    """Run-to-run noise of a case: the median absolute deviation of its run means over their median."""
+    means = run_means(result)
+    if len(means) < 2:
+        return 0.0
+    median = np.median(means)
+    # 1.4826 scales the MAD to a standard deviation for normally distributed runs
+    return float(1.4826 * np.median(np.abs(means - median)) / median) if median else 0.0
+
+
+def compare_reports(baseline, current, threshold=0.10, noise_factor=3.0):
+    """
+    Compare two bench.py reports case by case.
+
+    Returns a list of dicts with the case name, the baseline and current
+    median-of-means latency in microseconds, the relative change, the
+    threshold applied, a status: 'regressed', 'improved', 'ok',
+    'skipped' (skipped in either report), 'new' or 'missing', and
+    not_run, set when the case ran in the baseline but was skipped or is
+    missing in the current report.
+    """
+    base_results = {result['name']: result for result in baseline['results']}
+    current_results = {result['name']: result for result in current['results']}
+    rows = []
+    for name in list(base_results) + [name for name in current_results if name not in base_results]:
+        base, cur = base_results.get(name), current_results.get(name)
+        row = {'name': name, 'baseline_us': None, 'current_us': None, 'change': None, 'threshold': None,
+               'not_run': base is not None and 'skipped' not in base and (cur is None or 'skipped' in cur)}
+        if base is None:
+            row['status'] = 'new'
+        elif cur is None:
+            row['status'] = 'missing'
+        elif 'skipped' in base or 'skipped' in cur:
+            row['status'] = 'skipped'
+        else:
+            base_us, cur_us = base['median_mean_us'], cur['median_mean_us']
+            limit = max(threshold, noise_factor * max(relative_spread(base), relative_spread(cur)))
+            change = cur_us / base_us - 1.0
+            row.update(baseline_us=base_us, current_us=cur_us, change=change, threshold=limit)
+            if change > limit:
+                row['status'] = 'regressed'
+            elif change < -limit:
+                row['status'] = 'improved'
+            else:
+                row['status'] = 'ok'
+        rows.append(row)
+    return rows
+
+
+def environment_differences(baseline, current):
+    """Environment fields (versions, host) that differ between the two reports."""
+    base_env, cur_env = baseline.get('environment', {}), current.get('environment', {})
+    return [(key, base_env.get(key), cur_env.get(key))
+            for key in sorted(set(base_env) | set(cur_env))
+            if key != 'git_commit' and base_env.get(key) != cur_env.get(key)]
+
+
+def print_table(rows, file=sys.stdout):
+    def fmt_us(value):
+        return '-' if value is None else f'{value:,.1f}'
+
+    def fmt_pct(value):
+        return '-' if value is None else f'{value * 100:+.1f}%'
+
+    print(f"{'case':40s} {'baseline us':>14s} {'current us':>14s} {'change':>9s} {'limit':>8s}  status", file=file)
+    for row in rows:
+        limit = '-' if row['threshold'] is None else f"{row['threshold'] * 100:.1f}%"
+        print(f"{row['name']:40s} {fmt_us(row['baseline_us']):>14s} {fmt_us(row['current_us']):>14s} "
+              f"{fmt_pct(row['change']):>9s} {limit:>8s}  "
+              f"{row['status'].upper() if row['status'] == 'regressed' or row['not_run'] else row['status']}",
+              file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('baseline', help='baseline JSON written by bench.py')
+    parser.add_argument('--current', help='compare this bench.py JSON instead of running the benchmarks now')
+    parser.add_argument('--save', help='also write the fresh run to this file (e.g. to become the next baseline)')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='minimum relative slowdown that counts as a regression (default 0.10)')
+    parser.add_argument('--noise-factor', type=float, default=3.0,
+                        help='widen a case\'s threshold to this many times its run-to-run spread (default 3)')
+    parser.add_argument('--filter', action='append', help='only compare cases whose name contains this (repeatable)')
+    parser.add_argument('--repeat', type=int, help='timed runs per case (default: as in the baseline)')
+    parser.add_argument('--min-time', type=float, help='minimum seconds per timed run (default: as in the baseline)')
+    parser.add_argument('--allow-skipped', action='store_true',
+                        help='do not fail when a case that ran in the baseline is skipped or missing now')
+    args = parser.parse_args(argv)
+
+    baseline = load_report(args.baseline)
+    if args.filter:
+        baseline['results'] = [result for result in baseline['results']
+                               if any(f in result['name'] for f in args.filter)]
+    if args.current:
+        current = load_report(args.current)
+        if args.filter:
+            current['results'] = [result for result in current['results']
+                                  if any(f in result['name'] for f in args.filter)]
+    else:
+        import bench
+        settings = baseline.get('settings', {})
+        current = bench.run_benchmarks(
+            filters=args.filter or [result['name'] for result in baseline['results']],
+            repeat=args.repeat or settings.get('repeat', 3),
+            min_time=args.min_time or settings.get('min_time', 0.2),
+            seed=settings.get('seed', 0),
+            synthetic=settings.get('synthetic', False),
+        )
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    for key, base_value, cur_value in environment_differences(baseline, current):
+        print(f"warning: {key} differs from the baseline ({base_value} -> {cur_value})", file=sys.stderr)
+
+    rows = compare_reports(baseline, current, args.threshold, args.noise_factor)
+    print_table(rows)
+    regressed = [row['name'] for row in rows if row['status'] == 'regressed']
+    not_run = [row['name'] for row in rows if row['not_run']]
+    if not_run:
+        print(f"\n{len(not_run)} case(s) ran in the baseline but were skipped or missing now: {', '.join(not_run)}"
+              + (' (allowed by --allow-skipped)' if args.allow_skipped else ''))
+    if regressed:
+        print(f"\n{len(regressed)} case(s) regressed: {', '.join(regressed)}")
+        return EXIT_REGRESSION
+    if not_run and not args.allow_skipped:
+        return EXIT_NOT_RUN
+    print(f"\nNo regressions in {sum(row['status'] in ('ok', 'improved') for row in rows)} compared case(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Columnar (Arrow/Parquet) readers and writers for training and batch scoring.
+
+Every reader takes an optional list of columns and only loads those, so a
+scorer that needs the 13 heart, 12 kidney and 12 diabetes fields never
+decodes the rest of a wide extract. CSV input is still accepted, with the
+projection applied while parsing. Parquet is the preferred format for large
+extracts; convert a CSV once with:
+
+    python columnar_io.py applicants.csv applicants.parquet [--chunk-size 1000000]
+
+Scores are written as Parquet with float32 risks, int32 premiums and the
+risk tier dictionary-encoded (one small integer per row plus the tier names
+once per row group) instead of a repeated string.
+
+Needs pyarrow for anything Parquet or Arrow; plain CSV reading works without it.
+"""
+import argparse
+import io
+
+import numpy as np
+import pandas as pd
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather')
+
+SCORE_COLUMNS = ['heart_risk', 'kidney_risk', 'diabetes_risk', 'combined_risk']
+
+
+def is_parquet(path):
+    return path.lower().endswith(PARQUET_EXTENSIONS)
+
+
+def is_arrow(path):
+    return path.lower().endswith(ARROW_EXTENSIONS)
+
+
+def _csv_usecols(columns):
+    # A callable keeps read_csv from failing when a requested column is absent
+    if columns is None:
+        return None
+    wanted = set(columns)
+    return lambda column: column in wanted
+
+
+def parquet_columns(path, columns):
+    """The subset of columns present in a Parquet file's schema, or None for all of them."""
+    if columns is None:
+        return None
+    import pyarrow.parquet as pq
+    present = set(pq.ParquetFile(path).schema_arrow.names)
+    return [column for column in columns if column in present]
+
+
+def read_table(path, columns=None):
+    """
+    Read a whole CSV, Parquet or Arrow IPC (.arrow/.feather) file into a DataFrame.
+
+    Only the given columns are read (columns missing from the file are skipped).
+    """
+    if is_parquet(path):
+        return read_table_arrow(path, columns).to_pandas()
+    if is_arrow(path):
+        import pyarrow.feather as feather
+        table = feather.read_table(path)
+        if columns is not None:
+            table = table.select([column for column in columns if column in table.column_names])
+        return table.to_pandas()
+    return pd.read_csv(path, usecols=_csv_usecols(columns))
+
+
+def read_table_arrow(path, columns=None):
+    """Read a whole Parquet file as an Arrow table, keeping only the given columns."""
+    import pyarrow.parquet as pq
+    return pq.read_table(path, columns=parquet_columns(path, columns))
+
+
+def read_csv_bytes(data, columns=None):
+    """Parse an in-memory CSV block (header line included), keeping only the given columns."""
+    return pd.read_csv(io.BytesIO(data), usecols=_csv_usecols(columns))
+
+
+def iter_parquet_batches(path, chunk_size, columns=None):
+    """Yield Arrow record batches of at most chunk_size rows, reading only the given columns."""
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    yield from parquet_file.iter_batches(batch_size=chunk_size, columns=parquet_columns(path, columns))
+
+
+def scores_to_arrow(scores, tier_names, ids=None):
+    """
+    Build the Arrow table written for a chunk of scores.
+
+    Args:
+        scores: dict of arrays from predict.score_applicants_batch
+        tier_names: tier names indexed by scores['tier_index']
+        ids: optional applicant ids, written as the first column
+    """
+    import pyarrow as pa
+    columns = {}
+    if ids is not None:
+        columns['applicant_id'] = pa.array(ids)
+    for name in SCORE_COLUMNS:
+        columns[name] = pa.array(np.asarray(scores[name], dtype=np.float32))
+    columns['high_risk_override'] = pa.array(np.asarray(scores['high_risk_override'], dtype=np.bool_))
+    columns['risk_tier'] = pa.DictionaryArray.from_arrays(
+        pa.array(np.asarray(scores['tier_index'], dtype=np.int8)), pa.array(list(tier_names), pa.string()))
+    columns['min_premium'] = pa.array(np.asarray(scores['min_premium'], dtype=np.int32))
+    columns['max_premium'] = pa.array(np.asarray(scores['max_premium'], dtype=np.int32))
+    return pa.table(columns)
+
+
+class ParquetAppender:
+    """Appends Arrow tables to one Parquet file, one row group per table."""
+
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+
+    def write(self, table):
+        import pyarrow.parquet as pq
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _unified_csv_dtypes(csv_path, chunk_size):
+    """
+    Column dtypes that fit every chunk of a CSV file.
+
+    pandas infers types per chunk, so a column can come back as int64 in one
+    chunk, float64 in another (a missing value) and object in a third (stray
+    text such as '?'). The widest kind seen wins: text, then float, then int.
+    """
+    kinds = {}
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        for column, dtype in chunk.dtypes.items():
+            kinds.setdefault(column, set()).add(dtype.kind)
+    dtypes = {}
+    for column, seen in kinds.items():
+        if seen <= {'b'}:
+            dtypes[column] = 'boolean'
+        elif seen <= {'i', 'u'}:
+            dtypes[column] = 'int64'
+        elif seen <= {'i', 'u', 'f'}:
+            dtypes[column] = 'float64'
+        else:
+            dtypes[column] = 'string'
+    return dtypes
+
+
+def csv_to_parquet(csv_path, parquet_path, chunk_size=1000000):
+    """
+    Convert a CSV file to Parquet chunk by chunk, so memory stays bounded.
+
+    The file is read twice: once to settle a single type per column, then to
+    write it with that schema.
+    """
+    import pyarrow as pa
+    dtypes = _unified_csv_dtypes(csv_path, chunk_size)
+    rows = 0
+    schema = None
+    with ParquetAppender(parquet_path) as appender:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_size, dtype=dtypes):
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            schema = table.schema
+            appender.write(table)
+            rows += len(chunk)
+    print(f"Converted {rows} rows from {csv_path} to {parquet_path}")
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert a CSV file to Parquet")
+    parser.add_argument('input', help='CSV file')
+    parser.add_argument('output', help='Parquet file')
+    parser.add_argument('--chunk-size', type=int, default=1000000, help='rows per row group')
+    args = parser.parse_args()
+    csv_to_parquet(args.input, args.output, args.chunk_size)
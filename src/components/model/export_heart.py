@@ -0,0 +1,115 @@
+"""
+Export the Keras heart disease network to a compact NumPy file.
+
+The Dense layer weights, their activations and the feature names are
+written to heart_model.npz. By default the StandardScaler from scaler.joblib
+is folded into the first Dense layer, so the exported network takes raw
+features in feature_names.json order; --no-fold-scaler stores the scaler
+parameters separately instead. predict.py evaluates the network from that
+file with plain NumPy, so serving heart predictions never imports
+TensorFlow. Run this from the model directory after training with the v
+script:
+
+    python export_heart.py [--model heart_disease_model.h5] [--output heart_model.npz]
+"""
+import argparse
+import json
+import pickle
+
+import numpy as np
+from joblib import load
+
+# Bump when the layout of the exported file changes (must match predict.py)
+EXPORT_FORMAT = 1
+
+# Activations the NumPy forward pass in predict.py knows how to evaluate
+SUPPORTED_ACTIVATIONS = ('linear', 'relu', 'sigmoid')
+
+
+def load_keras_model(path):
+    """Load the trained network from a Keras .h5/.keras file or a pickle."""
+    if path.endswith('.pkl'):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    import tensorflow as tf
+    return tf.keras.models.load_model(path)
+
+
+def dense_layers(model):
+    """
+    Return [(kernel, bias, activation), ...] for the Dense layers of the model.
+
+    Dropout layers are skipped since they do nothing at inference time; any
+    other layer type cannot be exported.
+    """
+    layers = []
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        if kind == 'Dropout':
+            continue
+        if kind != 'Dense':
+            raise ValueError(f"Cannot export layer {layer.name} of type {kind}")
+        activation = layer.get_config()['activation']
+        if activation not in SUPPORTED_ACTIVATIONS:
+            raise ValueError(f"Unsupported activation '{activation}' in layer {layer.name}")
+        kernel, bias = layer.get_weights()
+        layers.append((kernel, bias, activation))
+    return layers
+
+
+def fold_scaler(layers, mean, scale):
+    """
+    Fold a StandardScaler into the first Dense layer.
+
+    ((x - mean) / scale) @ W + b == x @ (W / scale[:, None]) + (b - (mean / scale) @ W),
+    so the folded layer takes raw features and the separate scaling pass
+    (and its intermediate array) disappears from the serving path.
+    """
+    kernel, bias, activation = layers[0]
+    kernel = np.asarray(kernel, dtype=np.float64)
+    bias = np.asarray(bias, dtype=np.float64)
+    folded_kernel = kernel / scale[:, None]
+    folded_bias = bias - (mean / scale) @ kernel
+    return [(folded_kernel, folded_bias, activation)] + layers[1:]
+
+
+def export(model_path, scaler_path, features_path, output_path, fold=True):
+    model = load_keras_model(model_path)
+    scaler = load(scaler_path)
+    with open(features_path, 'r') as f:
+        features = json.load(f)
+
+    layers = dense_layers(model)
+    mean = np.asarray(scaler.mean_, dtype=np.float64)
+    scale = np.asarray(scaler.scale_, dtype=np.float64)
+    arrays = {
+        'format': np.array(EXPORT_FORMAT),
+        'features': np.array(features),
+        'activations': np.array([activation for _, _, activation in layers]),
+        'scaler_folded': np.array(fold),
+    }
+    if fold:
+        layers = fold_scaler(layers, mean, scale)
+    else:
+        arrays['scaler_mean'] = mean
+        arrays['scaler_scale'] = scale
+    for i, (kernel, bias, _) in enumerate(layers):
+        arrays[f'kernel_{i}'] = np.asarray(kernel, dtype=np.float64)
+        arrays[f'bias_{i}'] = np.asarray(bias, dtype=np.float64)
+
+    np.savez(output_path, **arrays)
+    shapes = ' -> '.join(str(kernel.shape[1]) for kernel, _, _ in layers)
+    print(f"Exported {len(layers)} dense layers ({len(features)} -> {shapes}) to {output_path}"
+          + (" with the scaler folded into the first layer" if fold else ""))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', default='heart_disease_model.h5', help='trained Keras model (.h5/.keras/.pkl)')
+    parser.add_argument('--scaler', default='scaler.joblib', help='fitted StandardScaler')
+    parser.add_argument('--features', default='feature_names.json', help='feature name list')
+    parser.add_argument('--output', default='heart_model.npz', help='exported NumPy file')
+    parser.add_argument('--no-fold-scaler', dest='fold', action='store_false',
+                        help='store the scaler separately instead of folding it into the first layer')
+    args = parser.parse_args()
+    export(args.model, args.scaler, args.features, args.output, fold=args.fold)
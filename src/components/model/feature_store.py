@@ -0,0 +1,241 @@
+"""
+Persistent, memory-mapped feature store for repeated rescoring.
+
+A store is a directory holding one contiguous row-major float64 matrix per
+disease (heart.f64, kidney.f64, diabetes.f64), an int64 applicant id per row
+(ids.i64) and a small manifest (store.json) with the column names and the
+number of committed rows. Rescoring reads the matrices through np.memmap,
+so no CSV is re-parsed and nothing is copied until the scorers touch it.
+New applicants are appended to the end of each file; existing rows are
+never rewritten. Features are kept in float64, the dtype the extract is
+parsed into, so rescoring from the store scores exactly the values the
+extract holds: float32 cannot represent decimals such as an oldpeak of 2.3,
+and its nearest value can fall on the other side of a rule threshold.
+
+Appends write the data files first and the manifest last (atomically), so a
+reader never sees a partly written row, and the leftovers of an interrupted
+append are truncated by the next one. Only one process should append to a
+store at a time. Build or extend a store from an extract in the
+score_batch.py input format with:
+
+    python feature_store.py applicants.csv store/ [--chunk-size 100000] [--check]
+
+and rescore it with `python score_batch.py store/ scores.parquet`. --check
+rescores the new rows from both the store and the extract with jitter off
+and fails unless every score matches.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+STORE_FORMAT = 2
+MANIFEST = 'store.json'
+IDS_FILE = 'ids.i64'
+FEATURE_DTYPE = np.float64
+ID_DTYPE = np.int64
+
+
+class FeatureStore:
+    """Append-only float64 feature matrices (one per disease) plus an applicant id index."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST), 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('format') == 1:
+            raise ValueError(f"{path} is a float32 feature store from an earlier release; rebuild it from the extract")
+        if manifest.get('format') != STORE_FORMAT:
+            raise ValueError(f"Unsupported feature store format {manifest.get('format')} in {path}")
+        self.columns = manifest['columns']
+        self.rows = manifest['rows']
+        self._id_positions = None
+
+    @classmethod
+    def create(cls, path, columns):
+        """
+        Create an empty store.
+
+        Args:
+            path: directory to create (must not already hold a store)
+            columns: dict mapping each disease to its feature names, in order
+        """
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, MANIFEST)):
+            raise FileExistsError(f"A feature store already exists in {path}")
+        for name in list(columns) + [None]:
+            open(cls._file(path, name), 'wb').close()
+        cls._write_manifest(path, {'format': STORE_FORMAT, 'columns': columns, 'rows': 0})
+        return cls(path)
+
+    @classmethod
+    def open_or_create(cls, path, columns):
+        """Open the store at path, creating it if needed; the columns must match an existing store."""
+        if not os.path.exists(os.path.join(path, MANIFEST)):
+            return cls.create(path, columns)
+        store = cls(path)
+        if store.columns != columns:
+            raise ValueError(f"Feature store {path} has different columns than requested")
+        return store
+
+    @staticmethod
+    def _file(path, disease):
+        return os.path.join(path, IDS_FILE if disease is None else f'{disease}.f64')
+
+    @staticmethod
+    def _write_manifest(path, manifest):
+        temp_path = os.path.join(path, MANIFEST + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, os.path.join(path, MANIFEST))
+
+    def __len__(self):
+        return self.rows
+
+    def _map(self, disease, dtype, row_shape, start, stop):
+        shape = (max(stop - start, 0),) + row_shape
+        if shape[0] == 0:
+            # np.memmap cannot map zero bytes
+            return np.empty(shape, dtype=dtype)
+        row_bytes = np.dtype(dtype).itemsize * int(np.prod(row_shape, dtype=np.int64))
+        return np.memmap(self._file(self.path, disease), dtype=dtype, mode='r',
+                         offset=start * row_bytes, shape=shape)
+
+    def matrix(self, disease, start=0, stop=None):
+        """Read-only (rows, k) float64 memory map of a disease's features, optionally for a row range."""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        return self._map(disease, FEATURE_DTYPE, (len(self.columns[disease]),), start, stop)
+
+    def ids(self, start=0, stop=None):
+        """Read-only memory map of the applicant ids, optionally for a row range."""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        return self._map(None, ID_DTYPE, (), start, stop)
+
+    def positions(self, applicant_ids):
+        """
+        Row numbers of the given applicant ids (-1 where an id is not stored).
+
+        The sorted id index is built on first use; if an id was appended more
+        than once, its last row wins.
+        """
+        if self._id_positions is None:
+            ids = np.asarray(self.ids())
+            # Stable sort of the reversed ids puts the last occurrence of each id first
+            order = len(ids) - 1 - np.argsort(ids[::-1], kind='stable')
+            self._id_positions = (ids[order], order)
+        sorted_ids, order = self._id_positions
+        applicant_ids = np.asarray(applicant_ids, dtype=ID_DTYPE)
+        if len(sorted_ids) == 0:
+            return np.full(applicant_ids.shape, -1, dtype=np.int64)
+        found = np.minimum(np.searchsorted(sorted_ids, applicant_ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[found] == applicant_ids, order[found], -1)
+
+    def append(self, matrices, applicant_ids=None):
+        """
+        Append rows to the store without rewriting existing ones.
+
+        Args:
+            matrices: dict mapping every disease to an (n, k) array in column order
+            applicant_ids: n integer ids; defaults to the row numbers the rows get
+        """
+        n = None
+        for disease, names in self.columns.items():
+            X = np.asarray(matrices[disease])
+            if X.ndim != 2 or X.shape[1] != len(names):
+                raise ValueError(f"Expected an (n, {len(names)}) {disease} matrix, got shape {X.shape}")
+            if n is not None and X.shape[0] != n:
+                raise ValueError("All disease matrices must have the same number of rows")
+            n = X.shape[0]
+        if applicant_ids is None:
+            applicant_ids = np.arange(self.rows, self.rows + n)
+        applicant_ids = np.asarray(applicant_ids, dtype=ID_DTYPE)
+        if applicant_ids.shape != (n,):
+            raise ValueError(f"Expected {n} applicant ids, got shape {applicant_ids.shape}")
+
+        items = [(disease, np.asarray(matrices[disease], dtype=FEATURE_DTYPE), len(names))
+                 for disease, names in self.columns.items()]
+        items.append((None, applicant_ids, 1))
+        for disease, data, width in items:
+            path = self._file(self.path, disease)
+            committed = self.rows * width * data.dtype.itemsize
+            with open(path, 'r+b') as f:
+                # Drop anything an interrupted append left past the committed rows
+                f.truncate(committed)
+                f.seek(committed)
+                f.write(np.ascontiguousarray(data).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        self.rows += n
+        self._id_positions = None
+        self._write_manifest(self.path, {'format': STORE_FORMAT, 'columns': self.columns, 'rows': self.rows})
+        return n
+
+
+def store_columns():
+    """The column layout used for stores built from score_batch.py input."""
+    import score_batch
+    return {prefix: list(names) for prefix, names, _ in score_batch.SECTIONS}
+
+
+def append_file(input_path, store_path, chunk_size, check=False):
+    """
+    Parse an applicant extract chunk by chunk and append it to the store.
+    
+    With check set, the appended rows are then rescored from the store and
+    compared with the extract (see check_scores).
+    """
+    import score_batch
+    store = FeatureStore.open_or_create(store_path, store_columns())
+    first_row = len(store)
+    for shard in score_batch.read_shards(input_path, chunk_size):
+        ids, matrices = score_batch.chunk_matrices(score_batch.load_shard(shard))
+        if ids is not None:
+            ids = np.asarray(ids, dtype=ID_DTYPE)
+        store.append(dict(zip(store.columns, matrices)), ids)
+    print(f"Feature store {store_path} now holds {len(store)} applicants")
+    if check:
+        check_scores(input_path, store, first_row, chunk_size)
+    return store
+
+
+def check_scores(input_path, store, first_row, chunk_size):
+    """
+    Score the extract and the store rows it was appended to (from first_row)
+    with jitter off and raise ValueError unless every score is identical.
+    """
+    import predict
+    import score_batch
+    previous_mode = predict.JITTER_MODE
+    predict.set_jitter_mode('off')
+    try:
+        start = first_row
+        for shard in score_batch.read_shards(input_path, chunk_size):
+            _, matrices = score_batch.chunk_matrices(score_batch.load_shard(shard))
+            stop = start + len(matrices[0])
+            expected = predict.score_applicants_batch(*matrices)
+            stored = predict.score_applicants_batch(*[store.matrix(disease, start, stop) for disease in store.columns])
+            for name in ('heart_risk', 'kidney_risk', 'diabetes_risk', 'combined_risk', 'tier_index'):
+                mismatched = np.flatnonzero(expected[name] != stored[name])
+                if len(mismatched):
+                    row = start + int(mismatched[0])
+                    raise ValueError(f"{name} of store row {row} differs from {input_path} "
+                                     f"({len(mismatched)} rows in rows {start}-{stop - 1})")
+            start = stop
+    finally:
+        predict.set_jitter_mode(previous_mode)
+    print(f"Scores of rows {first_row}-{start - 1} match {input_path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input', help='applicant extract (.csv or .parquet) in the score_batch.py format')
+    parser.add_argument('store', help='feature store directory (created if missing, appended to otherwise)')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='rows parsed and appended at a time')
+    parser.add_argument('--check', action='store_true',
+                        help='rescore the appended rows with jitter off and check they match the extract')
+    args = parser.parse_args()
+    append_file(args.input, args.store, args.chunk_size, args.check)
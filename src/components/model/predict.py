@@ -1,36 +1,26 @@
 import numpy as np
-import tensorflow as tf
+import atexit
+import sys
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from joblib import load
 import json
+import os
 import pickle
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from flask import Flask, request, render_template_string, jsonify, redirect, url_for, session, render_template
+import queue
+import threading
+import time
+from flask import Flask, request, jsonify, redirect, url_for, session, render_template, g, Response, has_request_context
 import random  # Added for simulated predictions
+import shutil
+import gzip
+import hashlib
 
-# Set default values for the models
-heart_model = None
-heart_scaler = None
-heart_features = []
-
-# Try to load the heart disease model using a safer method
 try:
-    # Skip type checking for the model loading - use direct file loading to avoid keras reference
-    heart_model = pickle.load(open('heart_disease_model.pkl', 'rb'))  # type: ignore
-    heart_scaler = load('scaler.joblib')
-    with open('feature_names.json', 'r') as f:
-        heart_features = json.load(f)
-    print("Heart disease model loaded successfully")
-except Exception as e:
-    print(f"Error loading heart disease model: {e}")
-    # Create placeholder model in case of loading failure
-    heart_model = None
-    heart_scaler = None
-    heart_features = []
-
-# Load or train the kidney disease model
-# Since the 'h' file contains training code, we'll train it when this script runs
-import pandas as pd
-from sklearn.model_selection import train_test_split
+    import brotli
+except ImportError:  # Brotli is optional; pages are still served gzip-compressed
+    brotli = None
 
 # Add model accuracy variables 
 # These would be determined during model training/validation in a production system
@@ -44,595 +34,939 @@ heart_weight = 0.50     # Heart disease has 50% of total weight
 kidney_weight = 0.30    # Kidney disease has 30% of total weight
 diabetes_weight = 0.20  # Diabetes has 20% of total weight
 
-try:
-    # Try to load kidney disease data
-    kidney_data = pd.read_csv('kidney_disease.csv')
-    
-    # Rename columns for consistency
-    kidney_data.columns = [col.strip().lower().replace(" ", "_") for col in kidney_data.columns]
+class EventLog:
+    """
+    Non-blocking structured log: one JSON object per line.
+    
+    emit() only builds a dict and puts it on a bounded queue; a background
+    thread serializes the events and writes them to the stream, flushing
+    whenever the queue runs empty. If the stream falls behind and the queue
+    fills up, new events are dropped and counted instead of blocking the
+    request thread. The writer thread is started by the first emit() in each
+    process, so workers forked after import log too.
+    """
     
-    # Fix inconsistent labels
-    kidney_data['classification'] = kidney_data['classification'].replace("ckd\t", "ckd")
+    def __init__(self, stream=None, max_queue=10000):
+        self.stream = stream or sys.stdout
+        self.max_queue = max_queue
+        self._closed = False
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # Nothing buffered in the parent should be written again by a child, and a
+            # child must not reuse a queue or lock the parent's writer thread was using
+            os.register_at_fork(before=self._flush_stream, after_in_child=self._reset)
+    
+    def _reset(self):
+        """Fresh queue, locks and counters, with no writer thread started yet."""
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._worker_lock = threading.Lock()
+        self._written = 0
+        self._dropped = 0
+        self._write_errors = 0
+        self._worker = None
+        self._worker_pid = None
+    
+    def _ensure_worker(self):
+        # The writer starts on first use in the process that emits: a process
+        # forked after import (gunicorn --preload workers, multiprocessing
+        # pools) inherits the log but not the parent's thread
+        if self._worker_pid != os.getpid():
+            with self._worker_lock:
+                if self._worker_pid != os.getpid():
+                    self._worker = threading.Thread(target=self._run, name='event-log', daemon=True)
+                    self._worker.start()
+                    self._worker_pid = os.getpid()
+    
+    def _flush_stream(self):
+        try:
+            self.stream.flush()
+        except Exception:
+            pass
+    
+    def emit(self, event, **fields):
+        """Queue an event; request_id is added automatically inside a request."""
+        self._ensure_worker()
+        record = {'ts': time.time(), 'event': event}
+        if has_request_context():
+            record['request_id'] = getattr(g, 'request_id', None)
+        record.update(fields)
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+    
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            try:
+                self.stream.write(json.dumps(record, default=str) + '\n')
+                if self._queue.empty():
+                    self.stream.flush()
+                with self._lock:
+                    self._written += 1
+            except Exception:
+                with self._lock:
+                    self._write_errors += 1
+    
+    def close(self, timeout=2.0):
+        """Write out the queued events (waiting at most timeout seconds) and stop the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._worker_pid != os.getpid():
+            # Nothing was emitted in this process
+            self._flush_stream()
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._worker.join(timeout)
+        self._flush_stream()
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'written': self._written,
+                'dropped': self._dropped,
+                'write_errors': self._write_errors,
+            }
+
+# Structured events go to stdout unless CARDIALINK_LOG_FILE names a file
+_log_path = os.environ.get('CARDIALINK_LOG_FILE')
+event_log = EventLog(
+    open(_log_path, 'a', buffering=1024 * 1024) if _log_path else None,
+    max_queue=int(os.environ.get('CARDIALINK_LOG_QUEUE_SIZE', 10000)),
+)
+atexit.register(event_log.close)
+log_event = event_log.emit
+
+# Location of the kidney model artifact written by train_kidney.py
+KIDNEY_MODEL_PATH = 'kidney_model.joblib'
+# Artifact layout understood by load_kidney_model (must match train_kidney.py)
+KIDNEY_ARTIFACT_FORMAT = 1
+# The same forest as CompiledForest arrays, also written by train_kidney.py
+KIDNEY_FOREST_PATH = 'kidney_model.forest'
+
+class CompiledForest:
+    """
+    A fitted scikit-learn forest flattened into contiguous NumPy arrays.
+    
+    The nodes of all trees are concatenated into one set of feature,
+    threshold, children and value arrays. A batch is evaluated level by level
+    for every (tree, row) pair at once instead of through sklearn's per-call
+    validation and per-tree dispatch. predict_proba returns the same
+    probabilities as the source model's predict_proba.
+    
+    The per-call overhead saved matters most for small batches; from a few
+    thousand rows on, sklearn's compiled per-row traversal is faster, so
+    batches above SOURCE_MODEL_MIN_ROWS are handed to the source model.
+    
+    save() writes the arrays as .npy files in a directory and load() maps
+    them back read-only, so serving needs neither scikit-learn nor any
+    unpickling. A loaded forest can be given a source_loader that returns
+    the scikit-learn forest; it is only called when the first large batch
+    arrives.
+    """
     
-    # Convert target labels to numerical values
-    kidney_data['classification'] = kidney_data['classification'].replace(['ckd', 'notckd'], [1, 0])
+    # Rows evaluated at a time, bounding the (trees, rows) node index arrays
+    CHUNK_ROWS = 65536
+    # Batches larger than this go to the source forest (None to never delegate)
+    SOURCE_MODEL_MIN_ROWS = 1024
+    
+    # Layout of a saved forest directory
+    FORMAT = 1
+    MANIFEST = 'forest.json'
+    ARRAYS = ('feature', 'threshold', 'children', 'missing_left', 'value', 'roots', 'depths', 'tree_positions',
+              'classes_')
+    
+    def __init__(self, feature, threshold, children, missing_left, value, roots, depths, tree_positions, classes,
+                 source=None, source_loader=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.depths = depths
+        self.tree_positions = tree_positions
+        # Number of trees still descending at each level (trees are sorted deepest first)
+        self.active_trees = [int(np.count_nonzero(depths > level)) for level in range(int(depths.max(initial=0)))]
+        self.classes_ = classes
+        self.source = source
+        self._source_loader = source_loader
+        self._source_lock = threading.Lock()
+    
+    def load_source(self):
+        """The scikit-learn forest, loaded through source_loader on first use (None if there is none)."""
+        if self.source is None and self._source_loader is not None:
+            with self._source_lock:
+                if self._source_loader is not None:
+                    self.source = self._source_loader()
+                    self._source_loader = None
+        return self.source
+    
+    def save(self, path, **metadata):
+        """
+        Write the arrays to a directory as .npy files plus a JSON manifest
+        holding metadata.
+        
+        The files are written to a new directory that then replaces the old
+        one, so processes still mapping the previous forest keep reading
+        intact files.
+        """
+        temp_path = path + '.tmp'
+        old_path = path + '.old'
+        for leftover in (temp_path, old_path):
+            if os.path.isdir(leftover):
+                shutil.rmtree(leftover)
+        os.makedirs(temp_path)
+        for name in self.ARRAYS:
+            np.save(os.path.join(temp_path, f'{name}.npy'), np.ascontiguousarray(getattr(self, name)),
+                    allow_pickle=False)
+        with open(os.path.join(temp_path, self.MANIFEST), 'w') as f:
+            json.dump({'format': self.FORMAT, **metadata}, f, indent=2)
+        if os.path.isdir(path):
+            os.rename(path, old_path)
+        os.rename(temp_path, path)
+        if os.path.isdir(old_path):
+            shutil.rmtree(old_path)
+    
+    @classmethod
+    def load(cls, path, source_loader=None):
+        """Memory-map a forest written by save(). Returns (forest, manifest metadata)."""
+        with open(os.path.join(path, cls.MANIFEST), 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != cls.FORMAT:
+            raise ValueError(f"Unsupported compiled forest format {manifest.get('format')} in {path}")
+        arrays = [np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+                  for name in cls.ARRAYS]
+        return cls(*arrays, source_loader=source_loader), manifest
+    
+    @classmethod
+    def from_sklearn(cls, forest):
+        # Trees are laid out deepest first so that each level only has to
+        # advance the trees that have not bottomed out yet
+        estimators = list(forest.estimators_)
+        order = sorted(range(len(estimators)), key=lambda i: -estimators[i].tree_.max_depth)
+        
+        features, thresholds, lefts, rights, missing_lefts, values, roots, depths = [], [], [], [], [], [], [], []
+        offset = 0
+        for i in order:
+            estimator = estimators[i]
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(offset, offset + n_nodes)
+            is_leaf = tree.children_left == -1
+            
+            # Leaves point back to themselves, so rows that reach a leaf early
+            # can keep stepping without changing their result
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            missing_left = getattr(tree, 'missing_go_to_left', None)
+            missing_lefts.append(np.zeros(n_nodes, dtype=bool) if missing_left is None
+                                 else np.asarray(missing_left, dtype=bool) & ~is_leaf)
+            
+            # Per-node class probabilities. scikit-learn >= 1.4 already stores
+            # class fractions; older versions store weighted counts, which
+            # DecisionTreeClassifier.predict_proba normalises the same way as here
+            value = np.array(tree.value[:, 0, :estimator.n_classes_], dtype=np.float64)
+            totals = value.sum(axis=1)
+            if not np.allclose(totals, 1.0):
+                totals[totals == 0.0] = 1.0
+                value /= totals[:, np.newaxis]
+            values.append(value)
+            
+            roots.append(offset)
+            depths.append(tree.max_depth)
+            offset += n_nodes
+        
+        tree_positions = np.empty(len(order), dtype=np.intp)
+        tree_positions[order] = np.arange(len(order))
+        return cls(np.concatenate(features).astype(np.intp),
+                   np.concatenate(thresholds),
+                   np.stack([np.concatenate(lefts), np.concatenate(rights)]).astype(np.intp),
+                   np.concatenate(missing_lefts),
+                   np.concatenate(values),
+                   np.array(roots, dtype=np.intp),
+                   np.array(depths),
+                   tree_positions,
+                   np.asarray(forest.classes_),
+                   source=forest)
+    
+    def predict_proba(self, X):
+        # Trees compare float32 features against float64 thresholds, as sklearn does
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2:
+            raise ValueError(f"Expected a 2-D feature matrix, got shape {X.shape}")
+        if self.SOURCE_MODEL_MIN_ROWS is not None and X.shape[0] > self.SOURCE_MODEL_MIN_ROWS:
+            source = self.load_source()
+            if source is not None:
+                return source.predict_proba(X)
+        proba = np.empty((X.shape[0], self.value.shape[1]))
+        for start in range(0, X.shape[0], self.CHUNK_ROWS):
+            chunk = X[start:start + self.CHUNK_ROWS]
+            proba[start:start + len(chunk)] = self._predict_chunk(chunk)
+        return proba
+    
+    def _predict_chunk(self, X):
+        n_rows, n_features = X.shape
+        n_trees = len(self.roots)
+        flat_X = X.ravel()
+        # Tree-major (trees, rows) node indices, flattened, and the offset of
+        # each entry's row in the flattened X
+        nodes = np.repeat(self.roots, n_rows)
+        row_offsets = np.tile(np.arange(0, X.size, n_features), n_trees)
+        check_missing = self.missing_left.any()
+        for active_trees in self.active_trees:
+            active = active_trees * n_rows
+            current = nodes[:active]
+            values = flat_X[row_offsets[:active] + self.feature[current]]
+            go_left = values <= self.threshold[current]
+            if check_missing:
+                go_left |= np.isnan(values) & self.missing_left[current]
+            # children[0] is the left child and children[1] the right one
+            nodes[:active] = self.children[(~go_left).view(np.uint8), current]
+        nodes = nodes.reshape(n_trees, n_rows)
+        
+        # Sum tree probabilities in estimator order (a reduction over the
+        # leading axis adds the trees one after another), then average, as
+        # sklearn does
+        proba = self.value[nodes[self.tree_positions]].sum(axis=0)
+        proba /= n_trees
+        return proba
+
+def _load_kidney_artifact(path):
+    """Unpickle the kidney model artifact written by train_kidney.py (imports scikit-learn)."""
+    import sklearn
+    
+    artifact = load(path)
+    if artifact.get('format') != KIDNEY_ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported kidney model artifact format: {artifact.get('format')}")
+    if artifact['sklearn_version'] != sklearn.__version__:
+        log_event('model_warning', disease='kidney',
+                  message=f"trained with scikit-learn {artifact['sklearn_version']}, running {sklearn.__version__}")
+    if list(artifact['features']) != KIDNEY_MODEL_FEATURES:
+        raise ValueError(f"Kidney model was trained on unexpected features: {artifact['features']}")
+    return artifact
+
+def load_kidney_model(path=KIDNEY_MODEL_PATH, forest_path=KIDNEY_FOREST_PATH):
+    """
+    Load the kidney RandomForest trained by train_kidney.py for serving.
     
-    # Convert necessary columns to numeric, coercing errors
-    kidney_data = kidney_data.apply(pd.to_numeric, errors='coerce')
+    train_kidney.py saves the forest twice: pickled (kidney_model.joblib) and
+    as CompiledForest arrays (kidney_model.forest/). The arrays are
+    memory-mapped, so loading takes milliseconds, imports no scikit-learn and
+    every worker process shares the same pages through the page cache. The
+    pickled forest is only unpickled when the first batch large enough to be
+    handed to it arrives. Without the arrays (an artifact from an older
+    train_kidney.py) the pickled forest is loaded and compiled in memory.
     
-    # Handle missing values
-    kidney_df = kidney_data.dropna(axis=0)
+    Returns a tuple of (compiled model, model version)
+    """
+    if not os.path.exists(os.path.join(forest_path, CompiledForest.MANIFEST)):
+        artifact = _load_kidney_artifact(path)
+        return CompiledForest.from_sklearn(artifact['model']), artifact['version']
+    
+    def load_source():
+        if not os.path.exists(path):
+            return None
+        artifact = _load_kidney_artifact(path)
+        if artifact['version'] != manifest['version']:
+            log_event('model_warning', disease='kidney',
+                      message=f"{path} is version {artifact['version']}, {forest_path} is {manifest['version']}; "
+                              "large batches use the compiled forest")
+            return None
+        return artifact['model']
+    
+    model, manifest = CompiledForest.load(forest_path, source_loader=load_source)
+    if list(manifest['features']) != KIDNEY_MODEL_FEATURES:
+        raise ValueError(f"Kidney model was trained on unexpected features: {manifest['features']}")
+    return model, manifest['version']
+
+# Heart network exported by export_heart.py, evaluated without TensorFlow
+HEART_NUMPY_MODEL_PATH = 'heart_model.npz'
+# Export layout understood by NumpyHeartNetwork (must match export_heart.py)
+HEART_EXPORT_FORMAT = 1
+
+class NumpyHeartNetwork:
+    """
+    Forward pass of the exported heart network (Dense -> Dropout -> Dense ->
+    Dropout -> Dense sigmoid) in plain NumPy. Dropout is the identity at
+    inference time, so only the Dense layers are stored. When the export has
+    the scaler folded into the first layer (the default), scaler_mean and
+    scaler_scale are None and raw features go straight into the first layer.
+    """
     
-    # Reset index
-    kidney_df = kidney_df.reset_index(drop=True)
+    ACTIVATIONS = {
+        'linear': lambda x: x,
+        'relu': lambda x: np.maximum(x, 0.0),
+        # tanh form of the logistic function, which cannot overflow
+        'sigmoid': lambda x: 0.5 * (1.0 + np.tanh(0.5 * x)),
+    }
+    
+    def __init__(self, layers, scaler_mean, scaler_scale, features):
+        self.layers = [(kernel, bias, self.ACTIVATIONS[activation]) for kernel, bias, activation in layers]
+        self.scaler_mean = scaler_mean
+        self.scaler_scale = scaler_scale
+        self.features = features
+    
+    @classmethod
+    def from_file(cls, path=HEART_NUMPY_MODEL_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['format']) != HEART_EXPORT_FORMAT:
+                raise ValueError(f"Unsupported heart model export format: {int(data['format'])}")
+            layers = [(data[f'kernel_{i}'], data[f'bias_{i}'], str(activation))
+                      for i, activation in enumerate(data['activations'])]
+            features = [str(f) for f in data['features']]
+            if 'scaler_folded' in data and bool(data['scaler_folded']):
+                return cls(layers, None, None, features)
+            return cls(layers, data['scaler_mean'], data['scaler_scale'], features)
+    
+    def predict_proba(self, X):
+        """Heart disease probability for each row of an (N, 13) raw feature matrix."""
+        activations = np.asarray(X, dtype=np.float64)
+        if self.scaler_mean is not None:
+            activations = (activations - self.scaler_mean) / self.scaler_scale
+        for kernel, bias, activation in self.layers:
+            activations = activation(activations @ kernel + bias)
+        return activations[:, 0]
+
+class KerasHeartModel:
+    """Pickled Keras heart network and its scaler behind the NumpyHeartNetwork interface."""
     
-    # Fix incorrect values if any exist
-    if 'wc' in kidney_df.columns:
-        kidney_df['wc'] = kidney_df['wc'].replace(["\t6200", "\t8400"], [6200, 8400])
+    def __init__(self, model, scaler, features):
+        self.model = model
+        self.scaler = scaler
+        self.features = features
     
-    # Feature selection (drop unnecessary or categorical columns)
-    X = kidney_df.drop(['classification', 'sg', 'appet', 'rc', 'pcv', 'hemo', 'sod', 'id'], axis=1, errors='ignore')
-    y = kidney_df['classification']
+    def predict_proba(self, X):
+        scaled = self.scaler.transform(np.asarray(X, dtype=np.float64))
+        return np.asarray(self.model.predict(scaled, verbose=0))[:, 0]
+
+def load_heart_model():
+    """
+    Load the heart disease network.
     
-    # Save kidney features for later use
-    kidney_features = X.columns.tolist()
+    The NumPy export is used when present. Otherwise the pickled Keras network
+    is unpickled, which imports TensorFlow, together with its scaler and
+    feature names.
+    """
+    if os.path.exists(HEART_NUMPY_MODEL_PATH):
+        with open(HEART_NUMPY_MODEL_PATH, 'rb') as f:
+            version = hashlib.sha256(f.read()).hexdigest()[:12]
+        return NumpyHeartNetwork.from_file(HEART_NUMPY_MODEL_PATH), version
     
-    # Train model
-    kidney_model = RandomForestClassifier(n_estimators=20, random_state=42)
-    kidney_model.fit(X, y)
+    # Skip type checking for the model loading - use direct file loading to avoid keras reference
+    with open('heart_disease_model.pkl', 'rb') as f:
+        model = pickle.load(f)  # type: ignore
+    scaler = load('scaler.joblib')
+    with open('feature_names.json', 'r') as f:
+        features = json.load(f)
+    return KerasHeartModel(model, scaler, features), None
+
+def load_diabetes_model():
+    """
+    Placeholder for the diabetes model.
     
-    print("Kidney disease model trained successfully.")
-except Exception as e:
-    print(f"Error loading or training kidney disease model: {e}")
-    # Create placeholder if loading fails
-    kidney_model = None
-    kidney_features = []
+    Since we have the m script but no saved model file, no model is loaded and
+    the rule-based scorer is used. In production, run the m script to train and
+    save the model first and load it here.
+    """
+    return None, None
 
-# Load the diabetes model
-try:
-    # For demonstration, we'll simulate loading a diabetes model
-    # In a real scenario, you'd load your trained model from a file
-    # Example: diabetes_model = pickle.load(open('diabetes_model.pkl', 'rb'))
-    
-    # Simulate diabetes model (in production, replace with actual model loading)
-    # Since we have the m script but no saved model file, we'll create a placeholder
-    # In production, run the m script to train and save the model first
-    diabetes_model = None
-    diabetes_features = ['HighBP', 'HighChol', 'CholCheck', 'BMI', 'Smoker', 
-                        'Stroke', 'HeartDiseaseorAttack', 'PhysActivity', 
-                        'Fruits', 'Veggies', 'HvyAlcoholConsump', 'AnyHealthcare',
-                        'NoDocbcCost', 'GenHlth', 'MentHlth', 'PhysHlth', 
-                        'DiffWalk', 'Sex', 'Age', 'Education', 'Income']
-    print("Diabetes model placeholder created (replace with actual model in production)")
-except Exception as e:
-    print(f"Error setting up diabetes model: {e}")
-    diabetes_model = None
-    diabetes_features = []
+class ModelRegistry:
+    """
+    Loads each disease backend on first use (or in a background warm-up thread)
+    and keeps track of its load state.
+    
+    Loaders are callables returning a tuple of (backend, version). A backend of
+    None means no model is available and the rule-based scorer should be used.
+    """
+    
+    def __init__(self):
+        self._loaders = {}
+        self._entries = {}
+        self._locks = {}
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+    
+    def _reset_after_fork(self):
+        """
+        Give a forked child fresh locks and restart any load that was running.
+        
+        A process forked while the warm-up thread is loading a backend (gunicorn
+        --preload workers) inherits that backend's lock held and its state set
+        to 'loading', but not the thread that would finish the load and release
+        the lock, so its first get() would block forever.
+        """
+        for name, entry in self._entries.items():
+            self._locks[name] = threading.Lock()
+            if entry['state'] == 'loading':
+                entry.update(state='unloaded', backend=None, version=None, error=None, load_seconds=None)
+    
+    def register(self, name, loader):
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+        self._entries[name] = {'state': 'unloaded', 'backend': None, 'version': None,
+                               'error': None, 'load_seconds': None}
+    
+    def get(self, name):
+        """Return the backend for a disease, loading it if needed (None if unavailable)."""
+        entry = self._entries[name]
+        if entry['state'] in ('unloaded', 'loading'):
+            self._load(name)
+        return entry['backend']
+    
+    def version(self, name):
+        self.get(name)
+        return self._entries[name]['version']
+    
+    def _load(self, name):
+        # One lock per disease so loading the heart network never blocks /kidney
+        with self._locks[name]:
+            entry = self._entries[name]
+            if entry['state'] not in ('unloaded', 'loading'):
+                return
+            entry['state'] = 'loading'
+            started = time.perf_counter()
+            try:
+                backend, version = self._loaders[name]()
+                entry['backend'] = backend
+                entry['version'] = version
+                entry['state'] = 'loaded' if backend is not None else 'unavailable'
+            except Exception as e:
+                entry['error'] = str(e)
+                entry['state'] = 'failed'
+            entry['load_seconds'] = time.perf_counter() - started
+            log_event('model_load', disease=name, state=entry['state'], version=entry['version'],
+                      load_seconds=entry['load_seconds'], error=entry.get('error'))
+    
+    def warm_up(self, names=None, background=True):
+        """Load the given backends (all by default), in a daemon thread if background is set."""
+        names = list(names or self._loaders)
+        
+        def load_all():
+            for name in names:
+                self.get(name)
+        
+        if not background:
+            load_all()
+            return None
+        thread = threading.Thread(target=load_all, name='model-warm-up', daemon=True)
+        thread.start()
+        return thread
+    
+    def status(self):
+        """Load state of every registered backend."""
+        return {
+            name: {key: value for key, value in entry.items() if key != 'backend'}
+            for name, entry in self._entries.items()
+        }
 
-app = Flask(__name__)
-# Add a secret key for session management
-app.secret_key = "cardialink_secret_key"
+model_registry = ModelRegistry()
+model_registry.register('heart', load_heart_model)
+model_registry.register('kidney', load_kidney_model)
+model_registry.register('diabetes', load_diabetes_model)
 
-# Base template with navigation
-BASE_TEMPLATE = """
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Disease Risk Prediction - CardiaLink</title>
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-    <style>
-        :root {
-            --background: #000000;
-            --foreground: #ffffff;
-            --primary: #dc2626;
-            --primary-hover: #b91c1c;
-            --primary-foreground: #ffffff;
-            --secondary: #171717;
-            --secondary-foreground: #f1f1f1;
-            --muted: #262626;
-            --muted-foreground: #a3a3a3;
-            --border: #333333;
-            --radius: 0.5rem;
-        }
-        
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: 'Inter', system-ui, sans-serif;
-            background-color: #000000;
-            color: var(--foreground);
-            line-height: 1.5;
-        }
-        
-        .relative {
-            position: relative;
-        }
-        
-        .absolute {
-            position: absolute;
-        }
-        
-        .inset-0 {
-            top: 0;
-            right: 0;
-            bottom: 0;
-            left: 0;
-        }
-        
-        .z-10 {
-            z-index: 10;
-        }
-        
-        .z-0 {
-            z-index: 0;
-        }
-        
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 0 1rem;
-        }
-        
-        section {
-            position: relative;
-            overflow: hidden;
-            padding: 3rem 0;
-        }
-        
-        @media (min-width: 768px) {
-            section {
-                padding: 4rem 0;
+class MicroBatcher:
+    """
+    Collects concurrent single-row predictions into batches.
+    
+    Request threads call submit() with one feature row and block until the
+    result is ready. A background thread takes the first queued row, waits up
+    to max_delay seconds (or until max_batch_size rows are queued) for more,
+    runs predict_fn once on the stacked (N, k) matrix and hands each row its
+    result. This only pays off when requests are served concurrently (threaded
+    dev server, gthread or similar workers); a lone request waits at most
+    max_delay. A caller waits at most timeout seconds for its result and then
+    gets a TimeoutError, so a stuck predict never hangs a request. The worker
+    thread is started by the first submit() in each process, so workers
+    forked after the batcher was used get their own.
+    """
+    
+    # Upper bounds (seconds) of the queueing delay histogram buckets
+    DELAY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1)
+    
+    def __init__(self, name, predict_fn, max_batch_size=32, max_delay=0.002, timeout=1.0):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # A child must not reuse a queue or lock the parent's batcher thread was using
+            os.register_at_fork(after_in_child=self._reset)
+    
+    def _reset(self):
+        """Fresh queue, locks and statistics, with no worker thread started yet."""
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_pid = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = {}
+        self._delay_counts = [0] * (len(self.DELAY_BUCKETS) + 1)
+        self._delay_sum = 0.0
+        self._delay_max = 0.0
+        self._rows = 0
+        self._batches = 0
+        self._timeouts = 0
+    
+    def submit(self, row):
+        """
+        Queue one feature row and return its prediction once its batch has run.
+        
+        Raises concurrent.futures.TimeoutError if the result is not ready
+        within timeout seconds.
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((row, time.perf_counter(), future))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # If the row is still queued, the worker skips it
+            future.cancel()
+            with self._stats_lock:
+                self._timeouts += 1
+            raise
+    
+    def _ensure_worker(self):
+        # Keyed on the pid: a forked process inherits the parent's batcher but not its thread
+        if self._worker_pid != os.getpid():
+            with self._worker_lock:
+                if self._worker_pid != os.getpid():
+                    self._worker = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                    self._worker.start()
+                    self._worker_pid = os.getpid()
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+    
+    def _dispatch(self, batch):
+        # Drop rows whose caller timed out and cancelled them while they were queued
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        started = time.perf_counter()
+        self._record(len(batch), [started - enqueued for _, enqueued, _ in batch])
+        try:
+            results = self.predict_fn(np.array([row for row, _, _ in batch], dtype=np.float64))
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+    
+    def _record(self, batch_size, delays):
+        with self._stats_lock:
+            self._batches += 1
+            self._rows += batch_size
+            self._batch_sizes[batch_size] = self._batch_sizes.get(batch_size, 0) + 1
+            for delay in delays:
+                bucket = int(np.searchsorted(self.DELAY_BUCKETS, delay))
+                self._delay_counts[bucket] += 1
+                self._delay_sum += delay
+                self._delay_max = max(self._delay_max, delay)
+    
+    def metrics(self):
+        """Batch size distribution and queueing delay statistics."""
+        with self._stats_lock:
+            bucket_labels = [str(bound) for bound in self.DELAY_BUCKETS] + ['+Inf']
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_delay_seconds': self.max_delay,
+                'batches': self._batches,
+                'rows': self._rows,
+                'timeouts': self._timeouts,
+                'batch_sizes': dict(sorted(self._batch_sizes.items())),
+                'queue_delay_seconds': {
+                    'count': self._rows,
+                    'sum': self._delay_sum,
+                    'max': self._delay_max,
+                    'buckets': dict(zip(bucket_labels, self._delay_counts)),
+                },
             }
-        }
-        
-        .bg-vector {
-            position: absolute;
-            inset: 0;
-            background: linear-gradient(to bottom right, #1f1f1f, #0f0f0f);
-            z-index: -10;
-        }
-        
-        /* Grid pattern overlay */
-        .bg-grid {
-            position: absolute;
-            inset: 0;
-            background-image: linear-gradient(to right, #80808012 1px, transparent 1px),
-                              linear-gradient(to bottom, #80808012 1px, transparent 1px);
-            background-size: 24px 24px;
-            z-index: -5;
-        }
-        
-        /* Red accent glow */
-        .bg-glow {
-            position: absolute;
-            width: 40%;
-            height: 40%;
-            background-color: rgba(220, 38, 38, 0.2);
-            border-radius: 50%;
-            filter: blur(100px);
-            z-index: -5;
-        }
-        
-        .glow-1 {
-            top: 20%;
-            left: 20%;
-        }
-        
-        .glow-2 {
-            bottom: 30%;
-            right: 20%;
-            background-color: rgba(185, 28, 28, 0.15);
-        }
-        
-        /* Button styles */
-        .btn {
-            display: inline-flex;
-            align-items: center;
-            justify-content: center;
-            border-radius: var(--radius);
-            font-weight: 500;
-            padding: 0.5rem 1rem;
-            transition: all 0.3s ease;
-            cursor: pointer;
-            text-decoration: none;
-        }
-        
-        .btn-primary {
-            background: linear-gradient(to right, #dc2626, #b91c1c);
-            color: white;
-            border: none;
-            box-shadow: 0 4px 6px -1px rgba(220, 38, 38, 0.2);
-        }
-        
-        .btn-primary:hover {
-            background: linear-gradient(to right, #b91c1c, #991b1b);
-            box-shadow: 0 4px 10px -1px rgba(220, 38, 38, 0.3);
-        }
-        
-        .btn-outline {
-            background: transparent;
-            color: var(--primary);
-            border: 1px solid var(--primary);
-        }
-        
-        .btn-outline:hover {
-            background: rgba(220, 38, 38, 0.1);
-        }
-        
-        /* Form elements */
-        input, select, textarea {
-            width: 100%;
-            padding: 0.75rem;
-            border-radius: var(--radius);
-            border: 1px solid var(--border);
-            background-color: #171717;
-            color: var(--foreground);
-            margin-bottom: 1rem;
-        }
-        
-        input:focus, select:focus, textarea:focus {
-            outline: none;
-            border-color: var(--primary);
-            box-shadow: 0 0 0 3px rgba(220, 38, 38, 0.2);
-        }
-        
-        label {
-            display: block;
-            margin-bottom: 0.5rem;
-            font-weight: 500;
-            color: #a3a3a3;
-        }
-        
-        /* Card styles */
-        .card {
-            position: relative;
-            background-color: #171717;
-            border-radius: 1rem;
-            padding: 1.5rem;
-            overflow: hidden;
-            border: 1px solid #333333;
-            backdrop-filter: blur(10px);
-        }
-        
-        .card::before {
-            content: '';
-            position: absolute;
-            inset: 0;
-            border-radius: 1rem;
-            padding: 1px;
-            background: linear-gradient(to bottom right, rgba(220, 38, 38, 0.3), transparent);
-            -webkit-mask: linear-gradient(#fff 0 0) content-box, linear-gradient(#fff 0 0);
-            -webkit-mask-composite: xor;
-            mask-composite: exclude;
-            pointer-events: none;
-        }
-        
-        /* Header and navigation */
-        header {
-            padding: 1rem 0;
-            background-color: rgba(0, 0, 0, 0.8);
-            backdrop-filter: blur(8px);
-            border-bottom: 1px solid var(--border);
-            position: sticky;
-            top: 0;
-            z-index: 100;
-        }
-        
-        nav {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }
-        
-        .logo {
-            font-size: 1.5rem;
-            font-weight: 700;
-            display: flex;
-            align-items: center;
-            gap: 0.5rem;
-        }
-        
-        .logo-text {
-            background: linear-gradient(to right, #dc2626, #ef4444);
-            -webkit-background-clip: text;
-            background-clip: text;
-            color: transparent;
-        }
 
-        .heart-icon {
-            color: var(--primary);
-            fill: var(--primary);
-            height: 1.2rem;
-            width: 1.2rem;
-            animation: heartbeat 1.5s ease-in-out infinite;
-        }
+def _predict_kidney_rows(X):
+    """Kidney disease probability for each row of an (N, 11) KIDNEY_MODEL_FEATURES matrix."""
+    return model_registry.get('kidney').predict_proba(X)[:, 1]
 
-        @keyframes heartbeat {
-            0%, 100% { transform: scale(1); }
-            25% { transform: scale(1.2); }
-            50% { transform: scale(1); }
-            75% { transform: scale(1.1); }
-        }
-        
-        /* Loading screen styles */
-        .loading-overlay {
-            position: fixed;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 100%;
-            background-color: rgba(0, 0, 0, 0.95);
-            display: flex;
-            flex-direction: column;
-            justify-content: center;
-            align-items: center;
-            z-index: 9999;
-            opacity: 0;
-            transition: opacity 0.3s ease-in-out;
-        }
-        
-        .loading-overlay.visible {
-            opacity: 1;
-        }
-        
-        .medical-logo {
-            width: 80px;
-            height: 80px;
-            margin-bottom: 20px;
-            position: relative;
-        }
-        
-        .medical-logo svg {
-            width: 100%;
-            height: 100%;
-            fill: var(--primary);
-            animation: pulse-heart 1.5s ease-in-out infinite;
-        }
-        
-        @keyframes pulse-heart {
-            0%, 100% { transform: scale(1); opacity: 1; }
-            50% { transform: scale(1.2); opacity: 0.8; }
-        }
-        
-        .loading-text {
-            font-size: 1.5rem;
-            font-weight: 500;
-            margin-bottom: 30px;
-            color: white;
-            background: linear-gradient(to right, #dc2626, #ef4444);
-            -webkit-background-clip: text;
-            background-clip: text;
-            color: transparent;
-        }
-        
-        .progress-container {
-            width: 300px;
-            height: 8px;
-            background-color: var(--muted);
-            border-radius: 5px;
-            overflow: hidden;
-            margin-bottom: 10px;
-        }
-        
-        .progress-bar {
-            height: 100%;
-            width: 0;
-            background: linear-gradient(to right, #dc2626, #ef4444);
-            border-radius: 5px;
-            transition: width 0.2s ease-out;
-        }
-        
-        .progress-percentage {
-            font-size: 0.9rem;
-            color: var(--muted-foreground);
-        }
-        
-        .fade-out {
-            animation: fadeOut 0.5s forwards;
-        }
-        
-        @keyframes fadeOut {
-            from { opacity: 1; }
-            to { opacity: 0; }
-        }
-        
-        .nav-links {
-            display: flex;
-            gap: 1.5rem;
-            align-items: center;
-        }
-        
-        .nav-links a {
-            color: var(--foreground);
-            text-decoration: none;
-            font-weight: 500;
-            transition: color 0.2s ease;
-        }
-        
-        .nav-links a:hover {
-            color: var(--primary);
-        }
-        
-        /* Headings with gradient text */
-        h1, h2, h3 {
-            font-weight: 700;
-            line-height: 1.2;
-        }
-        
-        .gradient-text {
-            background: linear-gradient(to right, #dc2626, #ef4444);
-            -webkit-background-clip: text;
-            background-clip: text;
-            color: transparent;
-        }
-        
-        h1 {
-            font-size: 2.5rem;
-            margin-bottom: 1.5rem;
-        }
-        
-        h2 {
-            font-size: 2rem;
-            margin-bottom: 1rem;
-        }
-        
-        h3 {
-            font-size: 1.5rem;
-            margin-bottom: 0.75rem;
-        }
-        
-        /* Utility classes */
-        .text-center {
-            text-align: center;
-        }
-        
-        .mb-1 {
-            margin-bottom: 0.25rem;
-        }
-        
-        .mb-2 {
-            margin-bottom: 0.5rem;
-        }
-        
-        .mb-4 {
-            margin-bottom: 1rem;
-        }
-        
-        .mb-6 {
-            margin-bottom: 1.5rem;
-        }
-        
-        .mb-8 {
-            margin-bottom: 2rem;
-        }
-        
-        .mt-4 {
-            margin-top: 1rem;
-        }
-        
-        .mt-8 {
-            margin-top: 2rem;
-        }
-        
-        .grid {
-            display: grid;
-            gap: 1.5rem;
-        }
-        
-        @media (min-width: 768px) {
-            .grid-cols-2 {
-                grid-template-columns: repeat(2, 1fr);
+# Batching limits for single-row model inference, configurable per deployment
+BATCH_MAX_SIZE = int(os.environ.get('CARDIALINK_BATCH_MAX_SIZE', 32))
+BATCH_MAX_DELAY = float(os.environ.get('CARDIALINK_BATCH_MAX_DELAY_MS', 2)) / 1000.0
+# Longest a request waits for a batched prediction before falling back to the rules
+BATCH_TIMEOUT = float(os.environ.get('CARDIALINK_BATCH_TIMEOUT_MS', 1000)) / 1000.0
+
+inference_batchers = {
+    'kidney': MicroBatcher('kidney', _predict_kidney_rows, BATCH_MAX_SIZE, BATCH_MAX_DELAY, BATCH_TIMEOUT),
+}
+
+class ScoreCache:
+    """
+    LRU cache of single-row disease scores with a size bound and a TTL.
+    
+    Entries are keyed on (disease, version, feature tuple). The version is
+    the model version for model scores and RULES_VERSION for rule-based ones,
+    so reloading a model never serves scores from the old one. Features are
+    keyed on their exact float values: "54" and "54.0" share an entry, but
+    no rounding is applied, since the rule bands have sharp edges (chol 240
+    and 239.9999996 score differently). Rows containing NaN are scored
+    without the cache, as NaN never equals itself and each one would add an
+    entry no lookup can hit. A max_size of 0 disables caching.
+    """
+    
+    def __init__(self, max_size=10000, ttl=3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._bypasses = 0
+        self._evictions = 0
+        self._expirations = 0
+    
+    def get_or_compute(self, disease, version, features, compute):
+        """Return the cached score for this feature row, calling compute() on a miss."""
+        if self.max_size <= 0:
+            return compute()
+        values = tuple(float(value) for value in features)
+        if any(value != value for value in values):
+            with self._lock:
+                self._bypasses += 1
+            return compute()
+        key = (disease, version, values)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                score, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return score
+                del self._entries[key]
+                self._expirations += 1
+            self._misses += 1
+        
+        # Computed outside the lock so a slow model call does not block other lookups
+        score = compute()
+        with self._lock:
+            self._entries[key] = (score, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return score
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Hit/miss/eviction counters and current size."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'size': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': self._hits / lookups if lookups else 0.0,
+                'bypasses': self._bypasses,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
             }
-        }
-        
-        /* Row and column styles for forms */
-        .row {
-            display: flex;
-            flex-wrap: wrap;
-            margin-right: -0.75rem;
-            margin-left: -0.75rem;
-            margin-bottom: 1rem;
-        }
-        
-        .col {
-            flex: 0 0 50%;
-            max-width: 50%;
-            padding-right: 0.75rem;
-            padding-left: 0.75rem;
-        }
-        
-        .form-group {
-            margin-bottom: 1rem;
-        }
-        
-        .flex {
-            display: flex;
-        }
-        
-        .items-center {
-            align-items: center;
-        }
-        
-        .justify-between {
-            justify-content: space-between;
-        }
-        
-        .gap-2 {
-            gap: 0.5rem;
-        }
-        
-        .gap-4 {
-            gap: 1rem;
-        }
-        
-        .w-full {
-            width: 100%;
-        }
-        
-        .p-4 {
-            padding: 1rem;
-        }
-        
-        .p-6 {
-            padding: 1.5rem;
-        }
-        
-        .rounded {
-            border-radius: var(--radius);
-        }
-        
-        .shadow {
-            box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1),
-                        0 2px 4px -2px rgba(0, 0, 0, 0.1);
-        }
-        
-        .text-muted {
-            color: var(--muted-foreground);
-        }
-        
-        .text-primary {
-            color: var(--primary);
-        }
-        
-        .text-sm {
-            font-size: 0.875rem;
-        }
-        
-        .text-lg {
-            font-size: 1.125rem;
-        }
-        
-        .font-bold {
-            font-weight: 700;
-        }
-        
-        .text-red {
-            color: #dc2626;
-        }
-        
-        .text-green {
-            color: #10b981;
-        }
-        
-        .text-yellow {
-            color: #f59e0b;
-        }
-        
-        /* Animation utility */
-        @keyframes pulse {
-            0%, 100% { opacity: 1; }
-            50% { opacity: 0.8; }
-        }
-        
-        .animate-pulse {
-            animation: pulse 2s cubic-bezier(0.4, 0, 0.6, 1) infinite;
-        }
-    </style>
+
+# Cache key version for rule-based scores; bump when the rule tables change
+RULES_VERSION = 'rules-1'
+
+score_cache = ScoreCache(
+    max_size=int(os.environ.get('CARDIALINK_SCORE_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('CARDIALINK_SCORE_CACHE_TTL', 3600)),
+)
+
+def cached_rule_score(disease, features, scorer):
+    """
+    Score one feature row with a vectorized rule scorer, through score_cache.
+    
+    Rule scores are only cached when JITTER_MODE makes them deterministic,
+    since with random jitter a cache hit would pin one random draw. The mode
+    is part of the cache key, so switching modes never serves stale scores.
+    """
+    compute = lambda: float(scorer([features])[0])
+    if JITTER_MODE == 'random':
+        return compute()
+    return score_cache.get_or_compute(disease, f"{RULES_VERSION}/{JITTER_MODE}", features, compute)
+
+class MetricsRegistry:
+    """
+    Counters and latency histograms, exposed in the Prometheus text format.
+    
+    Each metric is identified by its name plus a tuple of (label, value)
+    pairs. Histogram buckets are stored per bucket and made cumulative when
+    rendered, as Prometheus expects.
+    """
+    
+    # Upper bounds (seconds) of the latency histogram buckets
+    LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+    
+    def add_collector(self, collect):
+        """Register a function returning [(name, labels, value), ...] counters read at render time."""
+        self._collectors.append(collect)
+    
+    def describe(self, name, kind, help_text):
+        """Register the # TYPE and # HELP lines of a metric."""
+        self._help[name] = (kind, help_text)
+    
+    def increment(self, name, labels=(), amount=1):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + amount
+    
+    def observe(self, name, labels, seconds):
+        bucket = int(np.searchsorted(self.LATENCY_BUCKETS, seconds))
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = [[0] * (len(self.LATENCY_BUCKETS) + 1), 0.0, 0]
+            histogram[0][bucket] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+    
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = tuple(labels) + tuple(extra)
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+        return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+    
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            collectors = list(self._collectors)
+        for collect in collectors:
+            for name, labels, value in collect():
+                counters[(name, labels)] = value
+        counters = sorted(counters.items())
+        with self._lock:
+            histograms = sorted((key, (list(counts), total, count))
+                                for key, (counts, total, count) in self._histograms.items())
+        lines = []
+        described = set()
+        def header(name):
+            if name not in described and name in self._help:
+                kind, help_text = self._help[name]
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+            described.add(name)
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f'{name}{self._labels(labels)} {value}')
+        for (name, labels), (counts, total, count) in histograms:
+            header(name)
+            cumulative = 0
+            for bound, bucket_count in zip(self.LATENCY_BUCKETS + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{self._labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{self._labels(labels)} {total}')
+            lines.append(f'{name}_count{self._labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+app_metrics = MetricsRegistry()
+app_metrics.describe('cardialink_request_duration_seconds', 'histogram',
+                     'Request latency by route and method.')
+app_metrics.describe('cardialink_stage_duration_seconds', 'histogram',
+                     'Time spent in each request stage (parse, scoring, render) by route.')
+app_metrics.describe('cardialink_scores_total', 'counter',
+                     'Disease scores by source: model, rules, or rules after a model error.')
+app_metrics.describe('cardialink_exception_defaults_total', 'counter',
+                     'Form submissions that failed and were given the default risk.')
+app_metrics.describe('cardialink_log_events_total', 'counter',
+                     'Structured log events by outcome (written, dropped when the queue was full, write errors).')
+app_metrics.add_collector(lambda: [
+    ('cardialink_log_events_total', (('result', result),), event_log.stats()[result])
+    for result in ('written', 'dropped', 'write_errors')
+])
+app_metrics.describe('cardialink_score_cache_total', 'counter',
+                     'Score cache lookups (hits, misses, bypasses for rows with NaN) and removals by result.')
+app_metrics.add_collector(lambda: [
+    ('cardialink_score_cache_total', (('result', result),), score_cache.stats()[result])
+    for result in ('hits', 'misses', 'bypasses', 'evictions', 'expirations')
+])
+
+class StageTimer:
+    """
+    Splits one request into stages for cardialink_stage_duration_seconds.
+    
+    Each mark() records the time since the previous mark (or since the timer
+    was created) under the given stage name; timings_ms() returns the stages
+    marked so far for the structured log.
+    """
+    
+    def __init__(self, route):
+        self.route = route
+        self.timings = {}
+        self._last = time.perf_counter()
+    
+    def mark(self, stage):
+        now = time.perf_counter()
+        app_metrics.observe('cardialink_stage_duration_seconds',
+                            (('route', self.route), ('stage', stage)), now - self._last)
+        self.timings[stage] = now - self._last
+        self._last = now
+    
+    def timings_ms(self):
+        return {stage: round(seconds * 1000.0, 3) for stage, seconds in self.timings.items()}
+
+def record_score_source(disease, source):
+    app_metrics.increment('cardialink_scores_total', (('disease', disease), ('source', source)))
+
+def record_exception_default(disease):
+    app_metrics.increment('cardialink_exception_defaults_total', (('disease', disease),))
+
+app = Flask(__name__)
+# Add a secret key for session management
+app.secret_key = "cardialink_secret_key"
+
+# Base template with navigation
+BASE_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Disease Risk Prediction - CardiaLink</title>
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
+    <link rel="stylesheet" href="{{ base_stylesheet_url }}">
 </head>
 <body>
     <!-- Header -->
@@ -1886,354 +2220,60 @@ DIABETES_TEMPLATE = """
                         </div>
                         
                         <button type="submit" class="primary-btn"><span>Complete Assessment</span></button>
-                    </form>
-                </div>
-                
-                {% if prediction is not none %}
-                <div class="card result">
-                    <h2>Prediction Result</h2>
-                    <p>Diabetes Risk Probability: <span class="{{ 'high-risk' if prediction > 0.5 else 'low-risk' }}">{{ "%.2f"|format(prediction*100) }}%</span></p>
-                    <p>Risk Assessment: <span class="{{ 'high-risk' if prediction > 0.5 else 'low-risk' }}">{{ "High" if prediction > 0.5 else "Low" }}</span></p>
-                    
-                    <div class="risk-meter">
-                        <div class="risk-indicator" style="left: {{ prediction*100 }}%;"></div>
-                    </div>
-                </div>
-                {% endif %}
-                
-                <div class="features-grid">
-                    <div class="feature-item">
-                        <svg class="feature-icon" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
-                            <path d="M20 21v-2a4 4 0 0 0-4-4H8a4 4 0 0 0-4 4v2"></path>
-                            <circle cx="12" cy="7" r="4"></circle>
-                        </svg>
-                        <span class="feature-text">Privacy Protected</span>
-                    </div>
-                    <div class="feature-item">
-                        <svg class="feature-icon" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
-                            <path d="M22 12h-4l-3 9L9 3l-3 9H2"></path>
-                        </svg>
-                        <span class="feature-text">Real-time Analysis</span>
-                    </div>
-                    <div class="feature-item">
-                        <svg class="feature-icon" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
-                            <rect x="3" y="3" width="18" height="18" rx="2" ry="2"></rect>
-                            <path d="M3 9h18"></path>
-                            <path d="M9 21V9"></path>
-                        </svg>
-                        <span class="feature-text">AI-Powered</span>
-                    </div>
-                </div>
-            </div>
-        </div>
-    </section>
-</body>
-</html>
-"""
-
-# After DIABETES_TEMPLATE, completely replace the existing RESULTS_TEMPLATE with this simplified version
-RESULTS_TEMPLATE = """
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Combined Health Risk Assessment - CardiaLink</title>
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-    <style>
-        :root {
-            --background: #0a0a0a;
-            --foreground: #ffffff;
-            --primary: #ff0000;
-            --primary-hover: #cc0000;
-            --primary-foreground: #ffffff;
-            --secondary: #1a1a1a;
-            --secondary-foreground: #ffffff;
-            --muted: #262626;
-            --muted-foreground: #a3a3a3;
-            --border: #2a2a2a;
-            --radius: 0.5rem;
-        }
-        
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: 'Inter', system-ui, sans-serif;
-            background-color: #000000;
-            color: var(--foreground);
-            line-height: 1.5;
-        }
-        
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 1rem;
-        }
-        
-        .header {
-            background-color: var(--background);
-            border-bottom: 1px solid var(--border);
-            box-shadow: 0 1px 2px 0 rgba(255, 0, 0, 0.1);
-            position: sticky;
-            top: 0;
-            z-index: 50;
-        }
-        
-        .header-inner {
-            display: flex;
-            align-items: center;
-            justify-content: space-between;
-            height: 4rem;
-        }
-        
-        .logo {
-            display: flex;
-            align-items: center;
-            font-weight: 600;
-            font-size: 1.25rem;
-            color: var(--foreground);
-            text-decoration: none;
-        }
-        
-        .logo svg {
-            width: 1.5rem;
-            height: 1.5rem;
-            margin-right: 0.5rem;
-            color: var(--primary);
-        }
-        
-        .tabs {
-            display: flex;
-            gap: 1rem;
-            padding: 0 1rem;
-            border-bottom: 1px solid var(--border);
-            background-color: var(--background);
-        }
-        
-        .tab {
-            padding: 0.75rem 1rem;
-            border-bottom: 2px solid transparent;
-            color: var(--muted-foreground);
-            text-decoration: none;
-            font-size: 0.875rem;
-            font-weight: 500;
-            transition: all 0.2s;
-        }
-        
-        .tab:hover {
-            color: var(--foreground);
-        }
-        
-        .tab.active {
-            color: var(--primary);
-            border-bottom-color: var(--primary);
-        }
-        
-        .main {
-            padding: 2rem 0;
-        }
-        
-        .card {
-            background-color: var(--secondary);
-            border-radius: var(--radius);
-            box-shadow: 0 4px 6px rgba(255, 0, 0, 0.1), 0 1px 3px rgba(255, 0, 0, 0.08);
-            padding: 1.5rem;
-            margin-bottom: 2rem;
-            border: 1px solid var(--border);
-        }
-        
-        h1 {
-            font-size: 1.75rem;
-            font-weight: 700;
-            margin-bottom: 1rem;
-            background-image: linear-gradient(45deg, #ff0000, #ff6b6b);
-            -webkit-background-clip: text;
-            background-clip: text;
-            color: transparent;
-            display: inline-block;
-        }
-        
-        h2 {
-            font-size: 1.25rem;
-            font-weight: 600;
-            margin-bottom: 1rem;
-            margin-top: 1.5rem;
-        }
-        
-        h3 {
-            font-size: 1.1rem;
-            font-weight: 600;
-            margin-bottom: 0.75rem;
-        }
-        
-        p {
-            margin-bottom: 1rem;
-        }
-        
-        .risk-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-            gap: 1.5rem;
-            margin-bottom: 2rem;
-        }
-        
-        .risk-card {
-            background-color: var(--background);
-            border-radius: var(--radius);
-            border: 1px solid var(--border);
-            padding: 1.25rem;
-            box-shadow: 0 1px 3px 0 rgba(0, 0, 0, 0.1), 0 1px 2px 0 rgba(0, 0, 0, 0.06);
-        }
-        
-        .risk-card h3 {
-            display: flex;
-            align-items: center;
-            font-size: 1rem;
-            margin-bottom: 1rem;
-            gap: 0.5rem;
-        }
-        
-        .risk-card .icon {
-            background-color: var(--primary);
-            color: var(--primary-foreground);
-            width: 1.75rem;
-            height: 1.75rem;
-            border-radius: 9999px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-        }
-        
-        .risk-value {
-            font-size: 2rem;
-            font-weight: 700;
-            margin-bottom: 0.25rem;
-        }
-        
-        .high-risk {
-            color: #dc2626;
-        }
-        
-        .medium-risk {
-            color: #ca8a04;
-        }
-        
-        .low-risk {
-            color: #16a34a;
-        }
-        
-        .risk-label {
-            font-size: 0.875rem;
-            color: var(--muted-foreground);
-            margin-bottom: 1rem;
-        }
-        
-        .risk-summary {
-            padding: 2rem;
-            background-color: var(--background);
-            border-radius: var(--radius);
-            border: 1px solid var(--border);
-            box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1), 0 2px 4px -1px rgba(0, 0, 0, 0.06);
-            text-align: center;
-            margin-bottom: 2rem;
-        }
-        
-        .risk-meter {
-            height: 0.5rem;
-            background: linear-gradient(to right, #16a34a, #ca8a04, #dc2626);
-            border-radius: 9999px;
-            margin-top: 1.5rem;
-            position: relative;
-        }
-        
-        .risk-indicator {
-            position: absolute;
-            top: -0.25rem;
-            width: 1rem;
-            height: 1rem;
-            background-color: var(--foreground);
-            border: 2px solid white;
-            border-radius: 9999px;
-            transform: translateX(-50%);
-        }
-        
-        /* Insurance Premium Box Styles */
-        .insurance-box {
-            margin-top: 2rem;
-            padding: 1.5rem;
-            background-color: var(--secondary);
-            border: 1px solid var(--border);
-            border-radius: var(--radius);
-            box-shadow: 0 4px 6px -1px rgba(255, 0, 0, 0.1);
-            text-align: center;
-            color: var(--foreground);
-        }
-        
-        .insurance-box h3 {
-            font-size: 1.25rem;
-            margin-bottom: 1rem;
-            color: var(--foreground);
-        }
-        
-        .tier-badge {
-            display: inline-block;
-            padding: 0.35rem 1rem;
-            border-radius: 9999px;
-            font-weight: 600;
-            font-size: 0.875rem;
-            margin-bottom: 1rem;
-        }
-        
-        .tier-low {
-            background-color: rgba(22, 163, 74, 0.15);
-            color: #4ade80;
-            border: 1px solid rgba(22, 163, 74, 0.3);
-        }
-        
-        .tier-medium {
-            background-color: rgba(202, 138, 4, 0.15);
-            color: #facc15;
-            border: 1px solid rgba(202, 138, 4, 0.3);
-        }
-        
-        .tier-high {
-            background-color: rgba(234, 88, 12, 0.15);
-            color: #fb923c;
-            border: 1px solid rgba(234, 88, 12, 0.3);
-        }
-        
-        .tier-critical {
-            background-color: rgba(220, 38, 38, 0.15);
-            color: #ef4444;
-            border: 1px solid rgba(220, 38, 38, 0.3);
-        }
-        
-        .premium-amount {
-            font-size: 1.75rem;
-            font-weight: 700;
-            margin: 1rem 0;
-            color: var(--foreground);
-        }
-        
-        .premium-note {
-            font-size: 0.875rem;
-            color: var(--muted-foreground);
-        }
-        
-        .premium-info {
-            background-color: var(--background);
-            border-radius: var(--radius);
-            padding: 1rem;
-            margin-top: 1rem;
-            font-size: 0.875rem;
-            line-height: 1.5;
-            color: var(--muted-foreground);
-            border-left: 3px solid var(--primary);
-        }
-    </style>
+                    </form>
+                </div>
+                
+                {% if prediction is not none %}
+                <div class="card result">
+                    <h2>Prediction Result</h2>
+                    <p>Diabetes Risk Probability: <span class="{{ 'high-risk' if prediction > 0.5 else 'low-risk' }}">{{ "%.2f"|format(prediction*100) }}%</span></p>
+                    <p>Risk Assessment: <span class="{{ 'high-risk' if prediction > 0.5 else 'low-risk' }}">{{ "High" if prediction > 0.5 else "Low" }}</span></p>
+                    
+                    <div class="risk-meter">
+                        <div class="risk-indicator" style="left: {{ prediction*100 }}%;"></div>
+                    </div>
+                </div>
+                {% endif %}
+                
+                <div class="features-grid">
+                    <div class="feature-item">
+                        <svg class="feature-icon" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
+                            <path d="M20 21v-2a4 4 0 0 0-4-4H8a4 4 0 0 0-4 4v2"></path>
+                            <circle cx="12" cy="7" r="4"></circle>
+                        </svg>
+                        <span class="feature-text">Privacy Protected</span>
+                    </div>
+                    <div class="feature-item">
+                        <svg class="feature-icon" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
+                            <path d="M22 12h-4l-3 9L9 3l-3 9H2"></path>
+                        </svg>
+                        <span class="feature-text">Real-time Analysis</span>
+                    </div>
+                    <div class="feature-item">
+                        <svg class="feature-icon" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
+                            <rect x="3" y="3" width="18" height="18" rx="2" ry="2"></rect>
+                            <path d="M3 9h18"></path>
+                            <path d="M9 21V9"></path>
+                        </svg>
+                        <span class="feature-text">AI-Powered</span>
+                    </div>
+                </div>
+            </div>
+        </div>
+    </section>
+</body>
+</html>
+"""
+
+# After DIABETES_TEMPLATE, completely replace the existing RESULTS_TEMPLATE with this simplified version
+RESULTS_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Combined Health Risk Assessment - CardiaLink</title>
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
+    <link rel="stylesheet" href="{{ results_stylesheet_url }}">
 </head>
 <body>
     <header class="header">
@@ -2377,120 +2417,291 @@ RESULTS_TEMPLATE = """
 </html>
 """
 
+# Compile the page templates once at startup. Rendering then only runs the
+# compiled template code, and the static markup and styles are emitted as
+# constant strings instead of being lexed and parsed on every request.
+BASE_PAGE = app.jinja_env.from_string(BASE_TEMPLATE)
+RESULTS_PAGE = app.jinja_env.from_string(RESULTS_TEMPLATE)
+
+# Cache-Control sent with the pre-rendered form pages. Clients may reuse a
+# page for a few minutes and then revalidate it with If-None-Match.
+FORM_PAGE_CACHE_CONTROL = 'public, max-age=300'
+# Stylesheet URLs contain a hash of their content, so they never change
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+class PrecompressedResponse:
+    """
+    A response body built once and kept as identity, gzip and (if available)
+    brotli encoded bodies, each with its own strong ETag.
+    """
+    
+    def __init__(self, body, mimetype='text/html', cache_control=FORM_PAGE_CACHE_CONTROL):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {'identity': (body, digest)}
+        # mtime=0 keeps the gzip output (and therefore the ETag) stable
+        self.variants['gzip'] = (gzip.compress(body, compresslevel=9, mtime=0), digest + '-gz')
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(body, quality=11), digest + '-br')
+    
+    def response(self):
+        """Build the response for the current request, answering 304 when the ETag matches."""
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in self.variants and request.accept_encodings[candidate] > 0:
+                encoding = candidate
+                break
+        body, etag = self.variants[encoding]
+        
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(body, mimetype=self.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = self.cache_control
+        response.vary.add('Accept-Encoding')
+        return response
+
+# Stylesheets used by the page templates, served from content-hashed URLs
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+STYLESHEETS = {'base_stylesheet_url': 'base.css', 'results_stylesheet_url': 'results.css'}
+_assets = {}
+
+def register_stylesheet(template_global, filename):
+    """
+    Load a stylesheet from static/css and expose its content-hashed URL
+    (e.g. /assets/base.3f2a9c1e0b7d.css) to the templates as template_global.
+    """
+    with open(os.path.join(STATIC_DIR, 'css', filename), 'rb') as f:
+        css = f.read()
+    stem, extension = os.path.splitext(filename)
+    hashed_name = f"{stem}.{hashlib.sha256(css).hexdigest()[:12]}{extension}"
+    _assets[hashed_name] = PrecompressedResponse(css, mimetype='text/css', cache_control=ASSET_CACHE_CONTROL)
+    app.jinja_env.globals[template_global] = f"/assets/{hashed_name}"
+
+for _template_global, _filename in STYLESHEETS.items():
+    register_stylesheet(_template_global, _filename)
+
+@app.route('/assets/<filename>')
+def asset(filename):
+    """Serve a content-hashed stylesheet with long-lived immutable caching."""
+    resource = _assets.get(filename)
+    if resource is None:
+        return "Not found", 404
+    return resource.response()
+
+# Form pages are identical for every visitor, so each is rendered and
+# compressed on its first GET and served from memory afterwards
+_form_pages = {}
+_form_pages_lock = threading.Lock()
+
+def serve_form_page(active_tab, content):
+    """Serve the pre-rendered form page for a tab, rendering it on first use."""
+    stages = StageTimer(f'/{active_tab}')
+    page = _form_pages.get(active_tab)
+    if page is None:
+        with _form_pages_lock:
+            page = _form_pages.get(active_tab)
+            if page is None:
+                page = PrecompressedResponse(BASE_PAGE.render(content=content, active_tab=active_tab).encode('utf-8'))
+                _form_pages[active_tab] = page
+    response = page.response()
+    stages.mark('render')
+    return response
+
 # Define app routes
 @app.route('/')
 def index():
     # Directly render the heart disease page
     return heart_disease()
 
-def calculate_rule_based_heart_risk(features):
+# Column order expected by the heart scorers (matches feature_names.json)
+HEART_FEATURE_NAMES = ['age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg',
+                       'thalach', 'exang', 'oldpeak', 'slope', 'ca', 'thal']
+# Values used by the /heart form when a field is missing or invalid
+HEART_FEATURE_DEFAULTS = [50.0, 0.0, 0.0, 120.0, 200.0, 0.0, 0.0, 150.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+
+# Banding tables for the vectorized heart rules. Each *_EDGES array is passed to
+# np.digitize, which returns the index of the band a value falls into, and the
+# matching *_POINTS array holds the risk added for that band.
+HEART_AGE_EDGES = np.array([40.0, 50.0, 60.0, 70.0])
+HEART_AGE_POINTS = np.array([0.1, 0.2, 0.3, 0.4, 0.5])
+HEART_BP_EDGES = np.array([120.0, 130.0, 140.0, 160.0])
+HEART_BP_POINTS = np.array([0.05, 0.1, 0.2, 0.3, 0.4])
+HEART_CHOL_EDGES = np.array([200.0, 240.0])
+HEART_CHOL_POINTS = np.array([0.05, 0.1, 0.3])
+
+# Random generator for the +/-0.05 noise added by the vectorized scorers
+_jitter_rng = np.random.default_rng()
+
+# How the rule-based scorers add their +/-0.05 noise:
+#   random - drawn from _jitter_rng on every call (the original behaviour)
+#   hashed - derived from a hash of the feature row, so identical inputs
+#            always get identical scores
+#   off    - no noise at all
+# Rule-based scores are deterministic (and cacheable) in the last two modes.
+JITTER_MODES = ('random', 'hashed', 'off')
+JITTER_MODE = os.environ.get('CARDIALINK_JITTER_MODE', 'random').strip().lower()
+if JITTER_MODE not in JITTER_MODES:
+    log_event('config_warning', setting='CARDIALINK_JITTER_MODE',
+              message=f"unknown jitter mode '{JITTER_MODE}', using 'random'")
+    JITTER_MODE = 'random'
+
+# Per-disease seeds so the same numbers entered on two forms get unrelated noise
+_JITTER_SALTS = {
+    'heart': np.uint64(0x6a09e667f3bcc908),
+    'kidney': np.uint64(0xbb67ae8584caa73b),
+    'diabetes': np.uint64(0x3c6ef372fe94f82b),
+}
+
+def _as_feature_matrix(features, feature_names):
     """
-    Calculate a rule-based heart disease risk score based on established clinical factors.
-    Used as a fallback when the model is unavailable or gives suspicious results.
+    Convert scorer input into a 2-D (N, len(feature_names)) float array.
+    
+    Accepts a single feature list, a list of rows, a NumPy array or a DataFrame.
+    DataFrames are reordered by column name. float64 and integer arrays (uint8,
+    int64, ...) keep their dtype so large batches are not copied; integers
+    promote exactly in the rule arithmetic. Narrower floats are widened to
+    float64, so a float32 matrix scores the same as the float64 copy of its
+    values, and anything else is converted to float64.
+    """
+    if hasattr(features, 'columns'):
+        features = features[feature_names].to_numpy()
+    matrix = np.asarray(features)
+    if (matrix.dtype == np.bool_ or not np.issubdtype(matrix.dtype, np.number)
+            or (np.issubdtype(matrix.dtype, np.floating) and matrix.dtype.itemsize < 8)):
+        matrix = matrix.astype(np.float64)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if matrix.ndim != 2 or matrix.shape[1] != len(feature_names):
+        raise ValueError(
+            f"Expected an (N, {len(feature_names)}) feature matrix, got shape {matrix.shape}"
+        )
+    return matrix
+
+def _mix64(h):
+    """splitmix64 finalizer, applied elementwise to a uint64 array (wraps on overflow)."""
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return h ^ (h >> np.uint64(31))
+
+def _stable_jitter(X, disease):
+    """
+    Input-derived noise in [-0.05, 0.05) for each row of X.
+    
+    Each row is hashed from the bit patterns of its values rounded to
+    float32, so the result does not depend on the input dtype (a float64
+    extract and the float32 feature store give the same noise), the batch
+    size or the row position.
+    """
+    # Adding 0.0 turns -0.0 into 0.0 so both hash the same
+    bits = np.ascontiguousarray(np.asarray(X, dtype=np.float32).astype(np.float64) + 0.0).view(np.uint64)
+    h = np.full(bits.shape[0], _JITTER_SALTS[disease], dtype=np.uint64)
+    for column in bits.T:
+        h = _mix64(h ^ column)
+    # Top 53 bits -> uniform float in [0, 1)
+    return (h >> np.uint64(11)) * (0.1 / 2.0 ** 53) - 0.05
+
+def set_jitter_mode(mode):
+    """Switch the rule-based scorers to one of JITTER_MODES at runtime."""
+    global JITTER_MODE
+    if mode not in JITTER_MODES:
+        raise ValueError(f"Unknown jitter mode '{mode}', expected one of {JITTER_MODES}")
+    JITTER_MODE = mode
+
+def _finalize_risk(risk_score, divisor, X, disease):
+    """
+    Normalize summed rule points to 0-1 and add the jitter selected by JITTER_MODE.
+    
+    The scalar calculate_rule_based_*_risk functions delegate to the batch
+    scorers, so both engines always apply the same mode.
+    """
+    risk_score = np.minimum(1.0, risk_score / divisor)
+    if JITTER_MODE == 'off':
+        return np.clip(risk_score, 0.0, 1.0)
+    if JITTER_MODE == 'hashed':
+        jitter = _stable_jitter(X, disease)
+    else:
+        jitter = _jitter_rng.uniform(-0.05, 0.05, size=risk_score.shape[0])
+    return np.clip(risk_score + jitter, 0.0, 1.0)
+
+def calculate_rule_based_heart_risk_batch(features):
+    """
+    Vectorized version of calculate_rule_based_heart_risk.
     
     Args:
-        features: List of heart disease features [age, sex, cp, trestbps, chol, fbs, restecg, 
-                                                 thalach, exang, oldpeak, slope, ca, thal]
+        features: (N, 13) array-like in HEART_FEATURE_NAMES order, or a DataFrame
+                  containing those columns
     
     Returns:
-        Float between 0 and 1 representing risk (higher = higher risk)
+        NumPy array of N floats between 0 and 1 (higher = higher risk)
     """
-    # Extract features
-    age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal = features
-    
-    # Initialize risk score
-    risk_score = 0.0
-    
-    # Age risk (increases with age)
-    if age < 40:
-        risk_score += 0.1
-    elif age < 50:
-        risk_score += 0.2
-    elif age < 60:
-        risk_score += 0.3
-    elif age < 70:
-        risk_score += 0.4
-    else:
-        risk_score += 0.5
-        
-    # Sex risk (men typically have higher heart disease risk)
-    if sex == 1:  # Male
-        risk_score += 0.1
-        
+    X = _as_feature_matrix(features, HEART_FEATURE_NAMES)
+    (age, sex, cp, trestbps, chol, fbs, restecg, thalach,
+     exang, oldpeak, slope, ca, thal) = X.T
+    
+    # Points are added in the same order as the original if/elif chain so the
+    # floating point sums match the scalar scorer exactly. np.fmin is used for
+    # the capped terms because, like Python's min(), it ignores NaN.
+    risk_score = np.zeros(X.shape[0])
+    
+    # Age risk (NaN falls into the last band, like the scalar else branch)
+    risk_score += HEART_AGE_POINTS[np.digitize(age, HEART_AGE_EDGES)]
+    
+    # Sex risk
+    risk_score += np.where(sex == 1, 0.1, 0.0)
+    
     # Chest pain type risk
-    if cp == 0:  # Typical angina
-        risk_score += 0.3
-    elif cp == 1:  # Atypical angina
-        risk_score += 0.2
-    elif cp == 2:  # Non-anginal pain
-        risk_score += 0.1
-    elif cp == 3:  # Asymptomatic
-        risk_score += 0.05
-        
-    # Blood pressure risk
-    if trestbps < 120:
-        risk_score += 0.05
-    elif trestbps < 130:
-        risk_score += 0.1
-    elif trestbps < 140:
-        risk_score += 0.2
-    elif trestbps < 160:
-        risk_score += 0.3
-    else:
-        risk_score += 0.4
-        
-    # Cholesterol risk
-    if chol < 200:
-        risk_score += 0.05
-    elif chol < 240:
-        risk_score += 0.1
-    else:
-        risk_score += 0.3
-        
-    # Blood sugar risk
-    if fbs == 1:  # High fasting blood sugar
-        risk_score += 0.1
-        
-    # Resting ECG risk
-    if restecg > 0:  # Abnormal
-        risk_score += 0.1
-        
-    # Maximum heart rate risk (higher max heart rate often indicates better cardiovascular fitness)
-    if thalach > 160:
-        risk_score += 0.05
-    elif thalach > 140:
-        risk_score += 0.1
-    else:
-        risk_score += 0.2
-        
+    risk_score += np.where(cp == 0, 0.3, np.where(cp == 1, 0.2, np.where(cp == 2, 0.1, np.where(cp == 3, 0.05, 0.0))))
+    
+    # Blood pressure and cholesterol risk
+    risk_score += HEART_BP_POINTS[np.digitize(trestbps, HEART_BP_EDGES)]
+    risk_score += HEART_CHOL_POINTS[np.digitize(chol, HEART_CHOL_EDGES)]
+    
+    # Blood sugar and resting ECG risk
+    risk_score += np.where(fbs == 1, 0.1, 0.0)
+    risk_score += np.where(restecg > 0, 0.1, 0.0)
+    
+    # Maximum heart rate risk
+    risk_score += np.where(thalach > 160, 0.05, np.where(thalach > 140, 0.1, 0.2))
+    
     # Exercise-induced angina risk
-    if exang == 1:  # Yes
-        risk_score += 0.3
-        
+    risk_score += np.where(exang == 1, 0.3, 0.0)
+    
     # ST depression risk
-    risk_score += min(0.3, oldpeak * 0.1)
-        
+    risk_score += np.fmin(0.3, oldpeak * 0.1)
+    
     # Slope risk
-    if slope == 2:  # Downsloping
-        risk_score += 0.2
-        
+    risk_score += np.where(slope == 2, 0.2, 0.0)
+    
     # Number of vessels risk
-    risk_score += min(0.3, ca * 0.1)
-        
+    risk_score += np.fmin(0.3, ca * 0.1)
+    
     # Thalassemia risk
-    if thal > 1:  # Abnormal
-        risk_score += 0.2
-        
-    # Normalize to 0-1 range
-    risk_score = min(1.0, risk_score / 3.0)
+    risk_score += np.where(thal > 1, 0.2, 0.0)
     
-    # Add slight randomness to avoid deterministic results
-    risk_score = max(0.0, min(1.0, risk_score + random.uniform(-0.05, 0.05)))
+    return _finalize_risk(risk_score, 3.0, X, 'heart')
+
+def calculate_rule_based_heart_risk(features):
+    """
+    Calculate a rule-based heart disease risk score based on established clinical factors.
+    Used as a fallback when the model is unavailable or gives suspicious results.
+    
+    Args:
+        features: List of heart disease features [age, sex, cp, trestbps, chol, fbs, restecg, 
+                                                 thalach, exang, oldpeak, slope, ca, thal]
     
-    return risk_score
+    Returns:
+        Float between 0 and 1 representing risk (higher = higher risk)
+    """
+    return float(calculate_rule_based_heart_risk_batch([features])[0])
 
 @app.route('/heart', methods=['GET', 'POST'])
 def heart_disease():
+    stages = StageTimer('/heart')
     # If form is submitted
     if request.method == 'POST':
         try:
@@ -2561,30 +2772,35 @@ def heart_disease():
             except ValueError:
                 thal = 0.0
             
+            stages.mark('parse')
+            
             # Calculate risk score using the rule-based approach
             features = [age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal]
-            risk_score = calculate_rule_based_heart_risk(features)
+            risk_score = cached_rule_score('heart', features, calculate_rule_based_heart_risk_batch)
+            record_score_source('heart', 'rules')
+            stages.mark('scoring')
             
             # Store heart risk score in session
             session['heart_risk'] = risk_score
-            print(f"Heart risk score saved: {risk_score}")
+            log_event('score', disease='heart', source='rules', risk=risk_score, timings_ms=stages.timings_ms())
             
             # Redirect to kidney disease assessment
             return redirect(url_for('kidney_disease'))
             
         except Exception as e:
-            print(f"Error processing heart disease form: {e}")
+            record_exception_default('heart')
             # Default to a mid-range prediction with some randomness
             prediction = 0.5 + random.uniform(-0.1, 0.1)
+            log_event('score', disease='heart', source='exception_default', risk=prediction, error=str(e))
             # Store heart risk score in session
             session['heart_risk'] = prediction
             # Still redirect to kidney disease assessment
             return redirect(url_for('kidney_disease'))
     
-    # Render the form template
-    return render_template_string(
-        BASE_TEMPLATE, 
-        content="""
+    # Serve the pre-rendered form page
+    return serve_form_page(
+        'heart',
+        """
         <section class="py-12">
             <div class="text-center mb-8">
                 <h1 class="gradient-text">Heart Disease Risk Assessment</h1>
@@ -2731,10 +2947,55 @@ def heart_disease():
                 </form>
             </div>
         </section>
-        """,
-        active_tab='heart'
+        """
     )
 
+# Column order expected by the kidney rule-based scorers
+KIDNEY_FEATURE_NAMES = ['age', 'bp', 'sg', 'al', 'su', 'rbc', 'pc', 'pcc', 'ba', 'bgr', 'bu', 'sc']
+# Values used by the /kidney form when a field is missing or invalid
+KIDNEY_FEATURE_DEFAULTS = [50.0, 120.0, 1.015, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 120.0, 30.0, 1.0]
+# Subset of KIDNEY_FEATURE_NAMES passed to the kidney RandomForest (no specific gravity)
+KIDNEY_MODEL_FEATURES = ['age', 'bp', 'al', 'su', 'rbc', 'pc', 'pcc', 'ba', 'bgr', 'bu', 'sc']
+
+def calculate_rule_based_kidney_risk_batch(features):
+    """
+    Vectorized version of calculate_rule_based_kidney_risk.
+    
+    Parameters:
+    - features: (N, 12) array-like in KIDNEY_FEATURE_NAMES order, or a DataFrame
+                containing those columns
+    
+    Returns:
+    - NumPy array of N risk scores between 0-1
+    """
+    X = _as_feature_matrix(features, KIDNEY_FEATURE_NAMES)
+    age, bp, sg, al, su, rbc, pc, pcc, ba, bgr, bu, sc = X.T
+    
+    # Nested np.where mirrors the scalar if/elif ladders (NaN matches no
+    # condition and adds nothing) and the points are summed in the same order
+    risk_score = np.zeros(X.shape[0])
+    
+    # Age and blood pressure risk
+    risk_score += np.where(age >= 60, 0.2, np.where(age >= 40, 0.1, 0.0))
+    risk_score += np.where(bp >= 140, 0.2, np.where(bp >= 130, 0.1, 0.0))
+    
+    # Albumin and sugar risk (higher = worse)
+    risk_score += np.fmin(0.3, al * 0.06)
+    risk_score += np.fmin(0.2, su * 0.04)
+    
+    # Abnormal red blood cells / pus cells, present pus cell clumps / bacteria
+    risk_score += np.where(rbc == 1, 0.1, 0.0)
+    risk_score += np.where(pc == 1, 0.1, 0.0)
+    risk_score += np.where(pcc == 1, 0.1, 0.0)
+    risk_score += np.where(ba == 1, 0.1, 0.0)
+    
+    # Blood glucose, blood urea and serum creatinine (higher = worse)
+    risk_score += np.where(bgr > 200, 0.2, np.where(bgr > 140, 0.1, 0.0))
+    risk_score += np.where(bu > 50, 0.3, np.where(bu > 40, 0.2, np.where(bu > 30, 0.1, 0.0)))
+    risk_score += np.where(sc > 1.5, 0.3, np.where(sc > 1.2, 0.2, np.where(sc > 0.9, 0.1, 0.0)))
+    
+    return _finalize_risk(risk_score, 2.0, X, 'kidney')
+
 # Function to calculate kidney risk based on rules (fallback mechanism)
 def calculate_rule_based_kidney_risk(features):
     """
@@ -2746,77 +3007,11 @@ def calculate_rule_based_kidney_risk(features):
     Returns:
     - float: risk score between 0-1
     """
-    age, bp, sg, al, su, rbc, pc, pcc, ba, bgr, bu, sc = features
-    
-    # Start with a base risk score
-    risk_score = 0.0
-    
-    # Age risk (older = higher risk)
-    if age >= 60:
-        risk_score += 0.2
-    elif age >= 40:
-        risk_score += 0.1
-    
-    # Blood pressure risk
-    if bp >= 140:
-        risk_score += 0.2
-    elif bp >= 130:
-        risk_score += 0.1
-    
-    # Albumin risk (higher = worse)
-    risk_score += min(0.3, al * 0.06)
-    
-    # Sugar risk (higher = worse)
-    risk_score += min(0.2, su * 0.04)
-    
-    # Red blood cells (abnormal = worse)
-    if rbc == 1:  # Abnormal
-        risk_score += 0.1
-    
-    # Pus cells (abnormal = worse)
-    if pc == 1:  # Abnormal
-        risk_score += 0.1
-    
-    # Pus cell clumps (present = worse)
-    if pcc == 1:  # Present
-        risk_score += 0.1
-    
-    # Bacteria (present = worse)
-    if ba == 1:  # Present
-        risk_score += 0.1
-    
-    # Blood glucose (higher = worse)
-    if bgr > 200:
-        risk_score += 0.2
-    elif bgr > 140:
-        risk_score += 0.1
-    
-    # Blood urea (higher = worse)
-    if bu > 50:
-        risk_score += 0.3
-    elif bu > 40:
-        risk_score += 0.2
-    elif bu > 30:
-        risk_score += 0.1
-    
-    # Serum creatinine (higher = worse)
-    if sc > 1.5:
-        risk_score += 0.3
-    elif sc > 1.2:
-        risk_score += 0.2
-    elif sc > 0.9:
-        risk_score += 0.1
-    
-    # Normalize to 0-1 range
-    risk_score = min(1.0, risk_score / 2.0)
-    
-    # Add slight randomness to avoid deterministic results
-    risk_score = max(0.0, min(1.0, risk_score + random.uniform(-0.05, 0.05)))
-    
-    return risk_score
+    return float(calculate_rule_based_kidney_risk_batch([features])[0])
 
 @app.route('/kidney', methods=['GET', 'POST'])
 def kidney_disease():
+    stages = StageTimer('/kidney')
     if request.method == 'POST':
         try:
             # Get form data with error handling
@@ -2880,30 +3075,42 @@ def kidney_disease():
             except (KeyError, ValueError):
                 sc = 1.0  # Default value
                 
+            stages.mark('parse')
+            
             # Calculate risk score
+            rule_features = [age, bp, sg, al, su, rbc, pc, pcc, ba, bgr, bu, sc]
+            kidney_model = model_registry.get('kidney')
             if kidney_model is not None:
                 # Create feature array for prediction
                 features = [age, bp, al, su, rbc, pc, pcc, ba, bgr, bu, sc]
                 # Make prediction
                 try:
-                    risk_score = float(kidney_model.predict_proba([[features]])[0][1])
+                    risk_score = score_cache.get_or_compute(
+                        'kidney', model_registry.version('kidney'), features,
+                        lambda: float(inference_batchers['kidney'].submit(features)))
+                    source = 'model'
                 except Exception as e:
-                    print(f"Error making kidney disease prediction: {e}")
-                    risk_score = calculate_rule_based_kidney_risk([age, bp, sg, al, su, rbc, pc, pcc, ba, bgr, bu, sc])
+                    log_event('model_error', disease='kidney', error=str(e))
+                    risk_score = cached_rule_score('kidney', rule_features, calculate_rule_based_kidney_risk_batch)
+                    source = 'rules_after_model_error'
             else:
                 # Use rule-based risk calculation as fallback
-                risk_score = calculate_rule_based_kidney_risk([age, bp, sg, al, su, rbc, pc, pcc, ba, bgr, bu, sc])
+                risk_score = cached_rule_score('kidney', rule_features, calculate_rule_based_kidney_risk_batch)
+                source = 'rules'
+            record_score_source('kidney', source)
+            stages.mark('scoring')
                 
             # Store risk score in session
             session['kidney_risk'] = risk_score
-            print(f"Kidney disease risk score: {risk_score}")
+            log_event('score', disease='kidney', source=source, risk=risk_score, timings_ms=stages.timings_ms())
             
             # Redirect to diabetes assessment
             return redirect(url_for('diabetes_disease'))
         except Exception as e:
-            print(f"Error in kidney disease risk calculation: {e}")
+            record_exception_default('kidney')
             # If there's an error, use a default risk score
             session['kidney_risk'] = 0.5
+            log_event('score', disease='kidney', source='exception_default', risk=0.5, error=str(e))
             return redirect(url_for('diabetes_disease'))
     
     # Content for the kidney disease template
@@ -3047,80 +3254,69 @@ def kidney_disease():
     </section>
     """
     
-    return render_template_string(BASE_TEMPLATE, content=content, active_tab='kidney')
+    return serve_form_page('kidney', content)
 
-# Function to calculate diabetes risk based on rules (fallback mechanism)
-def calculate_rule_based_diabetes_risk(features):
+# Column order expected by the diabetes rule-based scorers
+DIABETES_FEATURE_NAMES = ['age', 'gender', 'polyuria', 'polydipsia', 'sudden_weight_loss', 'weakness',
+                          'polyphagia', 'genital_thrush', 'visual_blurring', 'itching', 'irritability',
+                          'delayed_healing']
+# Values used by the /diabetes form when a field is missing or invalid
+DIABETES_FEATURE_DEFAULTS = [40.0] + [0.0] * 11
+
+# Risk added by each symptom column (DIABETES_FEATURE_NAMES[2:]) when it is 1
+DIABETES_SYMPTOM_WEIGHTS = np.array([0.15, 0.15, 0.15, 0.1, 0.15, 0.1, 0.1, 0.05, 0.05, 0.1])
+
+def calculate_rule_based_diabetes_risk_batch(features):
     """
-    Calculate a risk score for diabetes based on clinical factors
+    Vectorized version of calculate_rule_based_diabetes_risk.
+    
+    The symptom points are a single matrix-vector product of the 0/1 symptom
+    indicators with DIABETES_SYMPTOM_WEIGHTS; the age band and the age x gender
+    term are added element-wise. Results match the scalar scorer up to
+    floating point rounding of the sum.
     
     Parameters:
-    - features: list containing [age, gender, polyuria, polydipsia, sudden_weight_loss, weakness, 
-                               polyphagia, genital_thrush, visual_blurring, itching, irritability, 
-                               delayed_healing]
+    - features: (N, 12) array-like in DIABETES_FEATURE_NAMES order (uint8
+                matrices are used as-is, float32 is widened to float64), or a
+                DataFrame containing those columns
     
     Returns:
-    - float: risk score between 0-1
+    - NumPy array of N risk scores between 0-1
     """
-    age, gender, polyuria, polydipsia, sudden_weight_loss, weakness, polyphagia, genital_thrush, visual_blurring, itching, irritability, delayed_healing = features
-    
-    # Start with a base risk score
-    risk_score = 0.0
+    X = _as_feature_matrix(features, DIABETES_FEATURE_NAMES)
+    age = X[:, 0]
+    gender = X[:, 1]
     
     # Age risk (older = higher risk)
-    if age >= 60:
-        risk_score += 0.2
-    elif age >= 40:
-        risk_score += 0.1
-    elif age >= 30:
-        risk_score += 0.05
+    risk_score = np.where(age >= 60, 0.2, np.where(age >= 40, 0.1, np.where(age >= 30, 0.05, 0.0)))
     
     # Gender (males slightly higher risk after age 50)
-    if gender == 1 and age >= 50:
-        risk_score += 0.05
-    
-    # Major symptoms have higher weights
-    if polyuria == 1:  # Excessive urination
-        risk_score += 0.15
-    
-    if polydipsia == 1:  # Excessive thirst
-        risk_score += 0.15
-    
-    if sudden_weight_loss == 1:
-        risk_score += 0.15
-    
-    if weakness == 1:
-        risk_score += 0.1
-    
-    if polyphagia == 1:  # Excessive hunger
-        risk_score += 0.15
-    
-    # Secondary symptoms
-    if genital_thrush == 1:
-        risk_score += 0.1
+    risk_score += np.where((gender == 1) & (age >= 50), 0.05, 0.0)
     
-    if visual_blurring == 1:
-        risk_score += 0.1
+    # Major and secondary symptoms
+    symptoms = (X[:, 2:] == 1).astype(np.float64)
+    risk_score += symptoms @ DIABETES_SYMPTOM_WEIGHTS
     
-    if itching == 1:
-        risk_score += 0.05
-    
-    if irritability == 1:
-        risk_score += 0.05
-    
-    if delayed_healing == 1:
-        risk_score += 0.1
-    
-    # Normalize to 0-1 range
-    risk_score = min(1.0, risk_score / 1.6)
+    return _finalize_risk(risk_score, 1.6, X, 'diabetes')
+
+# Function to calculate diabetes risk based on rules (fallback mechanism)
+def calculate_rule_based_diabetes_risk(features):
+    """
+    Calculate a risk score for diabetes based on clinical factors
     
-    # Add slight randomness to avoid deterministic results
-    risk_score = max(0.0, min(1.0, risk_score + random.uniform(-0.05, 0.05)))
+    Parameters:
+    - features: list containing [age, gender, polyuria, polydipsia, sudden_weight_loss, weakness, 
+                               polyphagia, genital_thrush, visual_blurring, itching, irritability, 
+                               delayed_healing]
     
-    return risk_score
+    Returns:
+    - float: risk score between 0-1
+    """
+    return float(calculate_rule_based_diabetes_risk_batch([features])[0])
 
 @app.route('/diabetes', methods=['GET', 'POST'])
 def diabetes_disease():
+    stages = StageTimer('/diabetes')
     if request.method == 'POST':
         try:
             # Get form data with error handling
@@ -3184,23 +3380,28 @@ def diabetes_disease():
             except (KeyError, ValueError):
                 delayed_healing = 0.0  # Default no
             
+            stages.mark('parse')
+            
             # Use rule-based risk calculation as we don't have a diabetes model loaded
             features = [age, gender, polyuria, polydipsia, sudden_weight_loss, weakness, 
                        polyphagia, genital_thrush, visual_blurring, itching, irritability, 
                        delayed_healing]
             
-            risk_score = calculate_rule_based_diabetes_risk(features)
+            risk_score = cached_rule_score('diabetes', features, calculate_rule_based_diabetes_risk_batch)
+            record_score_source('diabetes', 'rules')
+            stages.mark('scoring')
                 
             # Store risk score in session
             session['diabetes_risk'] = risk_score
-            print(f"Diabetes risk score: {risk_score}")
+            log_event('score', disease='diabetes', source='rules', risk=risk_score, timings_ms=stages.timings_ms())
             
             # Redirect to results page
             return redirect(url_for('combined_results'))
         except Exception as e:
-            print(f"Error in diabetes risk calculation: {e}")
+            record_exception_default('diabetes')
             # If there's an error, use a default risk score
             session['diabetes_risk'] = 0.5
+            log_event('score', disease='diabetes', source='exception_default', risk=0.5, error=str(e))
             return redirect(url_for('combined_results'))
     
     # Content for the diabetes disease template
@@ -3345,11 +3546,12 @@ def diabetes_disease():
     </section>
     """
     
-    return render_template_string(BASE_TEMPLATE, content=content, active_tab='diabetes')
+    return serve_form_page('diabetes', content)
 
 # Add route for combined results
 @app.route('/results', methods=['GET'])
 def combined_results():
+    stages = StageTimer('/results')
     # Check if all risk scores exist (user should complete all assessments first)
     if 'heart_risk' not in session or 'kidney_risk' not in session or 'diabetes_risk' not in session:
         # If user tries to access results directly, redirect to heart
@@ -3359,41 +3561,129 @@ def combined_results():
     heart_risk = session.get('heart_risk', 0.5)
     kidney_risk = session.get('kidney_risk', 0.5)
     diabetes_risk = session.get('diabetes_risk', 0.5)
+    stages.mark('parse')
     
-    # Check if heart or kidney risk is extremely high (>90%), but NOT diabetes
-    has_extremely_high_risk = (heart_risk > 0.9 or kidney_risk > 0.9)
-    
-    # Calculate weighted mean based on weights
-    total_weight = heart_weight + kidney_weight + diabetes_weight
-    weighted_risk = (
-        (heart_risk * heart_weight) + 
-        (kidney_risk * kidney_weight) + 
-        (diabetes_risk * diabetes_weight)
-    ) / total_weight
-    
-    # Force combined risk to be high if heart or kidney risk is extremely high
-    if has_extremely_high_risk and weighted_risk < 0.9:
-        weighted_risk = max(weighted_risk, 0.9)  # Ensure minimum 90% risk
-        print("Applying high risk override due to heart or kidney disease risk exceeding 90%")
+    # Weighted mean of the three risks, with the >90% heart/kidney override
+    combined, overridden = combine_risks_batch([heart_risk], [kidney_risk], [diabetes_risk])
+    weighted_risk = float(combined[0])
     
     # Calculate insurance premium tier and range
     risk_tier, min_premium, max_premium = calculate_insurance_premium(weighted_risk)
-    print(f"Insurance premium calculation: {risk_tier} tier, ${min_premium}-${max_premium}")
-    
-    return render_template_string(RESULTS_TEMPLATE, 
-                                  active_tab='results',
-                                  heart_risk=heart_risk,
-                                  kidney_risk=kidney_risk,
-                                  diabetes_risk=diabetes_risk,
-                                  combined_risk=weighted_risk,
-                                  risk_tier=risk_tier,
-                                  min_premium=min_premium,
-                                  max_premium=max_premium)
+    stages.mark('scoring')
+    
+    page = render_template(RESULTS_PAGE, 
+                           active_tab='results',
+                           heart_risk=heart_risk,
+                           kidney_risk=kidney_risk,
+                           diabetes_risk=diabetes_risk,
+                           combined_risk=weighted_risk,
+                           risk_tier=risk_tier,
+                           min_premium=min_premium,
+                           max_premium=max_premium)
+    stages.mark('render')
+    log_event('results', combined_risk=weighted_risk, high_risk_override=bool(overridden[0]),
+              risk_tier=risk_tier, min_premium=min_premium, max_premium=max_premium,
+              timings_ms=stages.timings_ms())
+    return page
+
+class PremiumTable:
+    """
+    Insurance premium tiers as arrays, so any number of risks can be priced
+    with one np.searchsorted call.
+    
+    edges holds the inclusive upper bound (in percent) of every tier but the
+    last: a risk of exactly 10% is still "Very Low". Tiers are normally
+    loaded from premium_tiers.json, where each tier has a name, max_percent
+    (null for the last tier) and min/max premium in INR.
+    """
+    
+    def __init__(self, tiers):
+        if not tiers:
+            raise ValueError("Premium table needs at least one tier")
+        edges = [tier['max_percent'] for tier in tiers[:-1]]
+        if any(edge is None for edge in edges) or tiers[-1].get('max_percent') is not None:
+            raise ValueError("Only the last premium tier may (and must) have max_percent null")
+        self.edges = np.array(edges, dtype=np.float64)
+        if np.any(np.diff(self.edges) <= 0):
+            raise ValueError(f"Premium tier edges must be strictly increasing, got {edges}")
+        self.names = np.array([tier['name'] for tier in tiers], dtype=object)
+        self.min_premiums = np.array([tier['min_premium'] for tier in tiers], dtype=np.int64)
+        self.max_premiums = np.array([tier['max_premium'] for tier in tiers], dtype=np.int64)
+        if np.any(self.min_premiums > self.max_premiums):
+            raise ValueError("Premium tier min_premium must not exceed max_premium")
+    
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r') as f:
+            return cls(json.load(f)['tiers'])
+    
+    def tier_index(self, risk_scores):
+        """Index of the tier each risk score (0-1) falls into; NaN goes to the last tier."""
+        risk_percentage = np.asarray(risk_scores, dtype=np.float64) * 100
+        # side='left' puts a percentage equal to an edge into the lower tier (<=)
+        return np.searchsorted(self.edges, risk_percentage, side='left')
+    
+    def price(self, risk_scores):
+        """Return NumPy arrays (risk_tiers, min_premiums, max_premiums) for the given risks."""
+        index = self.tier_index(risk_scores)
+        return self.names[index], self.min_premiums[index], self.max_premiums[index]
+    
+    def to_dict(self):
+        tiers = []
+        for i, name in enumerate(self.names):
+            tiers.append({
+                'name': name,
+                'max_percent': float(self.edges[i]) if i < len(self.edges) else None,
+                'min_premium': int(self.min_premiums[i]),
+                'max_premium': int(self.max_premiums[i]),
+            })
+        return {'tiers': tiers}
+
+# Tier table used when premium_tiers.json is missing (the original pricing)
+DEFAULT_PREMIUM_TIERS = [
+    {'name': "Very Low", 'max_percent': 10, 'min_premium': 2000, 'max_premium': 3000},
+    {'name': "Low", 'max_percent': 20, 'min_premium': 3000, 'max_premium': 5000},
+    {'name': "Low-Medium", 'max_percent': 30, 'min_premium': 5000, 'max_premium': 8000},
+    {'name': "Medium", 'max_percent': 40, 'min_premium': 8000, 'max_premium': 12000},
+    {'name': "Medium-High", 'max_percent': 50, 'min_premium': 12000, 'max_premium': 17000},
+    {'name': "High", 'max_percent': 60, 'min_premium': 17000, 'max_premium': 22000},
+    {'name': "High-Risk", 'max_percent': 70, 'min_premium': 22000, 'max_premium': 28000},
+    {'name': "Very High", 'max_percent': 80, 'min_premium': 28000, 'max_premium': 35000},
+    {'name': "Critical", 'max_percent': 90, 'min_premium': 35000, 'max_premium': 43000},
+    {'name': "Extremely Critical", 'max_percent': None, 'min_premium': 43000, 'max_premium': 53000},
+]
+
+PREMIUM_TIERS_PATH = os.environ.get(
+    'CARDIALINK_PREMIUM_TIERS',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'premium_tiers.json'),
+)
+
+def load_premium_table(path=PREMIUM_TIERS_PATH):
+    """Load the premium tiers from path, falling back to DEFAULT_PREMIUM_TIERS if it does not exist."""
+    if not os.path.exists(path):
+        log_event('config_warning', setting='CARDIALINK_PREMIUM_TIERS',
+                  message=f"premium tier file {path} not found, using the default tiers")
+        return PremiumTable(DEFAULT_PREMIUM_TIERS)
+    return PremiumTable.from_file(path)
+
+premium_table = load_premium_table()
+
+def reload_premium_table(path=PREMIUM_TIERS_PATH):
+    """
+    Re-read the premium tiers, e.g. after actuaries change a tier boundary.
+    
+    The new table replaces the old one in a single assignment, so requests in
+    flight price against one table or the other, never a mix.
+    """
+    global premium_table
+    premium_table = load_premium_table(path)
+    return premium_table
 
 # Add a function to calculate insurance premium
 def calculate_insurance_premium(risk_score):
     """
-    Calculate insurance premium based on the risk score percentage:
+    Calculate insurance premium based on the risk score percentage, using
+    the tiers in premium_table (premium_tiers.json). The default tiers are:
     
     1-10%: INR 2,000-3,000
     11-20%: INR 3,000-5,000
@@ -3408,28 +3698,220 @@ def calculate_insurance_premium(risk_score):
     
     Returns a tuple of (risk_tier, min_premium, max_premium)
     """
-    risk_percentage = risk_score * 100
-    
-    if risk_percentage <= 10:
-        return "Very Low", 2000, 3000
-    elif risk_percentage <= 20:
-        return "Low", 3000, 5000
-    elif risk_percentage <= 30:
-        return "Low-Medium", 5000, 8000
-    elif risk_percentage <= 40:
-        return "Medium", 8000, 12000
-    elif risk_percentage <= 50:
-        return "Medium-High", 12000, 17000
-    elif risk_percentage <= 60:
-        return "High", 17000, 22000
-    elif risk_percentage <= 70:
-        return "High-Risk", 22000, 28000
-    elif risk_percentage <= 80:
-        return "Very High", 28000, 35000
-    elif risk_percentage <= 90:
-        return "Critical", 35000, 43000
-    else:
-        return "Extremely Critical", 43000, 53000
+    table = premium_table
+    index = int(table.tier_index(risk_score))
+    return table.names[index], int(table.min_premiums[index]), int(table.max_premiums[index])
+
+def calculate_insurance_premium_batch(risk_scores):
+    """
+    Vectorized version of calculate_insurance_premium.
+    
+    Returns a tuple of NumPy arrays (risk_tiers, min_premiums, max_premiums)
+    """
+    return premium_table.price(risk_scores)
+
+def reprice_book(combined_risks, table=None):
+    """
+    Re-tier a whole book of policies from their combined risks in one call.
+    
+    Args:
+        combined_risks: array-like of N combined risks (0-1)
+        table: PremiumTable to price with (defaults to premium_table), e.g. a
+               candidate table loaded with PremiumTable.from_file
+    
+    Returns:
+        Dict with 'tier_index' (integer codes into 'tier_names'), 'tier_names'
+        and the 'min_premium'/'max_premium' arrays. Tiers are returned as codes
+        rather than N strings so a million policies stay a few megabytes.
+    """
+    if table is None:
+        table = premium_table
+    # Smallest unsigned type that holds every tier index (uint8 for up to 256 tiers)
+    index = table.tier_index(combined_risks).astype(np.min_scalar_type(len(table.names) - 1))
+    return {
+        'tier_index': index,
+        'tier_names': list(table.names),
+        'min_premium': table.min_premiums[index],
+        'max_premium': table.max_premiums[index],
+    }
+
+# Largest number of applicants accepted by a single /api/score request
+MAX_BATCH_APPLICANTS = 10000
+
+def combine_risks_batch(heart_risk, kidney_risk, diabetes_risk):
+    """
+    Combine per-disease risks into the weighted overall risk.
+    
+    If heart or kidney risk (but NOT diabetes) is above 90%, the combined risk
+    is raised to at least 90%.
+    
+    Returns a tuple of NumPy arrays (combined_risk, high_risk_override)
+    """
+    heart_risk = np.asarray(heart_risk, dtype=np.float64)
+    kidney_risk = np.asarray(kidney_risk, dtype=np.float64)
+    diabetes_risk = np.asarray(diabetes_risk, dtype=np.float64)
+    
+    total_weight = heart_weight + kidney_weight + diabetes_weight
+    weighted_risk = (
+        (heart_risk * heart_weight) + 
+        (kidney_risk * kidney_weight) + 
+        (diabetes_risk * diabetes_weight)
+    ) / total_weight
+    
+    has_extremely_high_risk = (heart_risk > 0.9) | (kidney_risk > 0.9)
+    overridden = has_extremely_high_risk & (weighted_risk < 0.9)
+    return np.where(overridden, 0.9, weighted_risk), overridden
+
+def score_kidney_batch(features):
+    """
+    Score an (N, 12) kidney feature matrix, using the RandomForest when it is
+    loaded and falling back to the rule-based engine if it is not or if the
+    prediction fails.
+    """
+    X = _as_feature_matrix(features, KIDNEY_FEATURE_NAMES)
+    kidney_model = model_registry.get('kidney')
+    if kidney_model is not None:
+        model_columns = [KIDNEY_FEATURE_NAMES.index(name) for name in KIDNEY_MODEL_FEATURES]
+        try:
+            return kidney_model.predict_proba(X[:, model_columns])[:, 1].astype(np.float64)
+        except Exception as e:
+            log_event('model_error', disease='kidney', rows=len(X), error=str(e))
+    return calculate_rule_based_kidney_risk_batch(X)
+
+def score_applicants_batch(heart_features, kidney_features, diabetes_features):
+    """
+    Score N applicants for all three diseases in one vectorized pass.
+    
+    Args:
+        heart_features: (N, 13) array in HEART_FEATURE_NAMES order
+        kidney_features: (N, 12) array in KIDNEY_FEATURE_NAMES order
+        diabetes_features: (N, 12) array in DIABETES_FEATURE_NAMES order
+    
+    Returns:
+        Dict of NumPy arrays with per-disease risks, the combined risk, whether
+        the high risk override was applied and the insurance premium tier
+        (as names in 'risk_tier' and as integer codes into 'tier_names' in
+        'tier_index')
+    """
+    heart_risk = calculate_rule_based_heart_risk_batch(heart_features)
+    kidney_risk = score_kidney_batch(kidney_features)
+    diabetes_risk = calculate_rule_based_diabetes_risk_batch(diabetes_features)
+    combined_risk, overridden = combine_risks_batch(heart_risk, kidney_risk, diabetes_risk)
+    premiums = reprice_book(combined_risk)
+    tier_names = np.array(premiums['tier_names'], dtype=object)
+    return {
+        'heart_risk': heart_risk,
+        'kidney_risk': kidney_risk,
+        'diabetes_risk': diabetes_risk,
+        'combined_risk': combined_risk,
+        'high_risk_override': overridden,
+        'risk_tier': tier_names[premiums['tier_index']],
+        'tier_index': premiums['tier_index'],
+        'tier_names': premiums['tier_names'],
+        'min_premium': premiums['min_premium'],
+        'max_premium': premiums['max_premium'],
+    }
+
+def _parse_feature_rows(applicants, section, feature_names, defaults):
+    """
+    Build an (N, k) float matrix from the given section of each applicant dict.
+    Missing or invalid values use the same defaults as the HTML forms.
+    """
+    matrix = np.empty((len(applicants), len(feature_names)))
+    for row, applicant in enumerate(applicants):
+        values = applicant.get(section) or {}
+        if not isinstance(values, dict):
+            raise ValueError(f"Applicant {row}: '{section}' must be an object")
+        for col, (name, default) in enumerate(zip(feature_names, defaults)):
+            try:
+                matrix[row, col] = float(values[name])
+            except (KeyError, TypeError, ValueError):
+                matrix[row, col] = default
+    return matrix
+
+@app.route('/api/score', methods=['POST'])
+def batch_score_api():
+    """
+    Score a batch of applicants without the HTML form flow.
+    
+    Expects a JSON body of the form
+        {"applicants": [{"id": ..., "heart": {...}, "kidney": {...}, "diabetes": {...}}, ...]}
+    where each section maps the feature names used by the corresponding form to
+    values. A bare list of applicants is also accepted.
+    """
+    payload = request.get_json(silent=True)
+    applicants = payload.get('applicants') if isinstance(payload, dict) else payload
+    if not isinstance(applicants, list) or not all(isinstance(a, dict) for a in applicants):
+        return jsonify({'error': "Expected a JSON list of applicant objects under 'applicants'"}), 400
+    if len(applicants) > MAX_BATCH_APPLICANTS:
+        return jsonify({'error': f"At most {MAX_BATCH_APPLICANTS} applicants per request"}), 413
+    
+    try:
+        heart_X = _parse_feature_rows(applicants, 'heart', HEART_FEATURE_NAMES, HEART_FEATURE_DEFAULTS)
+        kidney_X = _parse_feature_rows(applicants, 'kidney', KIDNEY_FEATURE_NAMES, KIDNEY_FEATURE_DEFAULTS)
+        diabetes_X = _parse_feature_rows(applicants, 'diabetes', DIABETES_FEATURE_NAMES, DIABETES_FEATURE_DEFAULTS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    scores = score_applicants_batch(heart_X, kidney_X, diabetes_X)
+    
+    results = []
+    for i, applicant in enumerate(applicants):
+        result = {
+            'heart_risk': float(scores['heart_risk'][i]),
+            'kidney_risk': float(scores['kidney_risk'][i]),
+            'diabetes_risk': float(scores['diabetes_risk'][i]),
+            'combined_risk': float(scores['combined_risk'][i]),
+            'high_risk_override': bool(scores['high_risk_override'][i]),
+            'risk_tier': scores['risk_tier'][i],
+            'min_premium': int(scores['min_premium'][i]),
+            'max_premium': int(scores['max_premium'][i]),
+        }
+        if 'id' in applicant:
+            result['id'] = applicant['id']
+        results.append(result)
+    
+    return jsonify({'count': len(results), 'results': results})
+
+@app.route('/status', methods=['GET'])
+def service_status():
+    """Report the load state of each disease backend, the inference batching metrics and the score cache counters."""
+    return jsonify({
+        'models': model_registry.status(),
+        'batching': {name: batcher.metrics() for name, batcher in inference_batchers.items()},
+        'score_cache': score_cache.stats(),
+        'jitter_mode': JITTER_MODE,
+        'event_log': event_log.stats(),
+    })
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Reuse the caller's request id (e.g. from a load balancer) so log lines can be joined up
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+@app.after_request
+def record_request_latency(response):
+    started = getattr(g, 'request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        app_metrics.observe('cardialink_request_duration_seconds',
+                            (('route', route), ('method', request.method)),
+                            time.perf_counter() - started)
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request and stage latency histograms and scoring counters in the Prometheus text format."""
+    return Response(app_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Comma-separated list of backends to load in the background at startup
+# ("all" for every backend); by default every backend loads on first use
+_warm_models = os.environ.get('CARDIALINK_WARM_MODELS', '').strip()
+if _warm_models:
+    model_registry.warm_up(None if _warm_models == 'all' else _warm_models.split(','))
 
 if __name__ == '__main__':
     print("Disease Risk Assessment App is running on http://127.0.0.1:5000/")
@@ -0,0 +1,313 @@
+"""
+Score an applicant extract from the command line in bounded-memory chunks.
+
+The input has one row per applicant. Each assessment's form fields are
+prefixed with its disease: heart_age, heart_sex, ..., kidney_bp, ...,
+diabetes_polyuria. An optional applicant_id column is copied to the output.
+Missing columns and empty or invalid values use the same defaults as the
+forms. CSV and Parquet (.parquet, needs pyarrow) are supported for both
+input and output; only the columns listed in INPUT_COLUMNS are read, and
+Parquet output stores float32 risks and dictionary-encoded tiers (see
+columnar_io.py). The input may also be a feature store directory built
+with feature_store.py, which is read through memory maps instead of parsed.
+
+The input is split into row-range shards of --chunk-size rows. Each shard
+is parsed, scored with predict.score_applicants_batch (the three disease
+engines, the combined weighting and premium tiering) and formatted on a pool
+of --workers processes. Only a bounded number of shards are in flight at a
+time, and results are written in input order as they complete, so memory
+stays flat however large the extract is. Run this from the model directory:
+
+    python score_batch.py applicants.csv scores.csv [--chunk-size 100000] [--workers 8]
+
+CSV shards are cut on line boundaries, so quoted fields must not contain
+newlines.
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import columnar_io
+import predict
+from feature_store import FeatureStore
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # Installed with scikit-learn; without it BLAS keeps its default thread count
+    threadpool_limits = None
+
+ID_COLUMN = 'applicant_id'
+
+# (column prefix, feature names, form defaults) for each disease section
+SECTIONS = [
+    ('heart', predict.HEART_FEATURE_NAMES, predict.HEART_FEATURE_DEFAULTS),
+    ('kidney', predict.KIDNEY_FEATURE_NAMES, predict.KIDNEY_FEATURE_DEFAULTS),
+    ('diabetes', predict.DIABETES_FEATURE_NAMES, predict.DIABETES_FEATURE_DEFAULTS),
+]
+
+# The only input columns the scorer reads
+INPUT_COLUMNS = [ID_COLUMN] + [f'{prefix}_{name}' for prefix, names, _ in SECTIONS for name in names]
+
+OUTPUT_COLUMNS = ['heart_risk', 'kidney_risk', 'diabetes_risk', 'combined_risk',
+                  'high_risk_override', 'risk_tier', 'min_premium', 'max_premium']
+
+# Shards queued or running per worker; bounds memory while keeping workers busy
+SHARDS_IN_FLIGHT_PER_WORKER = 2
+
+
+def is_feature_store(path):
+    return os.path.isdir(path)
+
+
+def read_shards(path, chunk_size):
+    """
+    Yield the input as shards of at most chunk_size rows.
+    
+    CSV shards are the raw bytes of the header plus chunk_size lines, so the
+    text is parsed by the worker scoring the shard. Parquet shards are Arrow
+    record batches, which are already decoded and cheap to send to a worker.
+    Feature store shards are just (store path, start row, stop row); the
+    worker maps those rows itself, so no feature data is sent at all.
+    An input with columns but no rows yields one empty shard, so the output
+    still gets its header (or Parquet schema) and applicant_id column.
+    """
+    if is_feature_store(path):
+        rows = len(FeatureStore(path))
+        for start in range(0, max(rows, 1), chunk_size):
+            yield path, start, min(start + chunk_size, rows)
+        return
+    if columnar_io.is_parquet(path):
+        empty = True
+        for batch in columnar_io.iter_parquet_batches(path, chunk_size, INPUT_COLUMNS):
+            empty = False
+            yield batch
+        if empty:
+            yield columnar_io.read_table_arrow(path, INPUT_COLUMNS)
+        return
+    with open(path, 'rb') as f:
+        header = f.readline()
+        empty = True
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                break
+            empty = False
+            yield header + b''.join(lines)
+        if empty and header.strip():
+            yield header
+
+
+def load_shard(shard):
+    """Turn a CSV or Parquet shard from read_shards into a DataFrame."""
+    if isinstance(shard, bytes):
+        return columnar_io.read_csv_bytes(shard, INPUT_COLUMNS)
+    return shard.to_pandas()
+
+
+# Feature stores opened by this process, by path
+_stores = {}
+
+
+def store_matrices(shard):
+    """(ids, [heart, kidney, diabetes] float64 matrices) for a feature store shard, without copying."""
+    path, start, stop = shard
+    store = _stores.get(path)
+    if store is None or store.rows < stop:
+        store = _stores[path] = FeatureStore(path)
+    expected = {prefix: list(names) for prefix, names, _ in SECTIONS}
+    if store.columns != expected:
+        raise ValueError(f"Feature store {path} does not match the scorer's feature columns")
+    return store.ids(start, stop), [store.matrix(prefix, start, stop) for prefix, _, _ in SECTIONS]
+
+
+class ChunkWriter:
+    """
+    Appends chunks from encode_output() to a CSV or Parquet file as they are
+    produced. If nothing was written by close(), an empty file with the score
+    columns is written, so every run leaves a valid output behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._parquet = columnar_io.ParquetAppender(path) if columnar_io.is_parquet(path) else None
+        self._csv_file = None
+        self._chunks = 0
+
+    def write(self, encoded):
+        self._chunks += 1
+        if self._parquet is not None:
+            self._parquet.write(encoded)
+        elif self._csv_file is None:
+            self._csv_file = open(self.path, 'w', newline='')
+            self._csv_file.write(encoded)
+        else:
+            # Every encoded chunk starts with the header; keep only the first
+            self._csv_file.write(encoded.split('\n', 1)[1])
+
+    def close(self):
+        if self._chunks == 0:
+            empty = [np.empty((0, len(names))) for _, names, _ in SECTIONS]
+            self.write(encode_output(None, predict.score_applicants_batch(*empty), self._parquet is not None))
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._csv_file is not None:
+            self._csv_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def feature_matrix(chunk, prefix, feature_names, defaults):
+    """Build an (N, k) float matrix from the prefix_* columns of a chunk, filling gaps with defaults."""
+    X = np.empty((len(chunk), len(feature_names)))
+    for col, (name, default) in enumerate(zip(feature_names, defaults)):
+        column = f'{prefix}_{name}'
+        if column in chunk.columns:
+            X[:, col] = pd.to_numeric(chunk[column], errors='coerce').fillna(default).to_numpy()
+        else:
+            X[:, col] = default
+    return X
+
+
+def chunk_matrices(chunk):
+    """(applicant ids or None, [heart, kidney, diabetes] feature matrices) for an input chunk."""
+    matrices = [feature_matrix(chunk, *section) for section in SECTIONS]
+    ids = chunk[ID_COLUMN].to_numpy() if ID_COLUMN in chunk.columns else None
+    return ids, matrices
+
+
+def encode_output(ids, scores, parquet):
+    """
+    Prepare a scored chunk for ChunkWriter.write(). This runs in the worker,
+    so CSV formatting and Arrow conversion happen in parallel.
+    """
+    if parquet:
+        return columnar_io.scores_to_arrow(scores, scores['tier_names'], ids)
+    result = pd.DataFrame({column: scores[column] for column in OUTPUT_COLUMNS})
+    if ids is not None:
+        result.insert(0, ID_COLUMN, ids)
+    return result.to_csv(index=False)
+
+
+def score_shard(shard, parquet_output):
+    """Parse, score and encode one shard. Returns (encoded output, rows, worker pid, busy seconds)."""
+    started = time.perf_counter()
+    if isinstance(shard, tuple):
+        ids, matrices = store_matrices(shard)
+    else:
+        ids, matrices = chunk_matrices(load_shard(shard))
+    scores = predict.score_applicants_batch(*matrices)
+    encoded = encode_output(ids, scores, parquet_output)
+    return encoded, len(matrices[0]), os.getpid(), time.perf_counter() - started
+
+
+def available_cpus():
+    """CPU cores this process may run on (respects container/affinity limits where the OS reports them)."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def load_backends(chunk_size):
+    """
+    Load the model backends score_applicants_batch uses in this process.
+
+    Called before the pool is created, so forked workers inherit the loaded
+    models instead of each importing scikit-learn and loading the artifacts
+    on their first shard.
+    """
+    kidney_model = predict.model_registry.get('kidney')
+    max_rows = getattr(kidney_model, 'SOURCE_MODEL_MIN_ROWS', None)
+    if max_rows is not None and chunk_size > max_rows:
+        # Shards this large are handed to the scikit-learn forest
+        kidney_model.load_source()
+
+
+def init_worker(jitter_mode, single_threaded=False):
+    predict.set_jitter_mode(jitter_mode)
+    if single_threaded and threadpool_limits is not None:
+        # One BLAS thread per worker process, or N workers x N threads oversubscribe the cores
+        threadpool_limits(1)
+    # Forked workers inherit the parent's generator state; reseed so they do
+    # not all draw the same random jitter sequence
+    predict._jitter_rng = np.random.default_rng()
+
+
+class WorkerStats:
+    """Rows scored and busy time per worker process."""
+
+    def __init__(self):
+        self.rows = {}
+        self.busy = {}
+
+    def record(self, pid, rows, seconds):
+        self.rows[pid] = self.rows.get(pid, 0) + rows
+        self.busy[pid] = self.busy.get(pid, 0.0) + seconds
+
+    def report(self, file=sys.stderr):
+        for pid in sorted(self.rows):
+            rate = self.rows[pid] / self.busy[pid] if self.busy[pid] else 0.0
+            print(f"  worker {pid}: {self.rows[pid]} rows in {self.busy[pid]:.1f}s busy ({rate:,.0f} rows/s)",
+                  file=file)
+
+
+def score_file(input_path, output_path, chunk_size, workers=1, jitter_mode='random'):
+    rows = 0
+    stats = WorkerStats()
+    parquet_output = columnar_io.is_parquet(output_path)
+    started = time.perf_counter()
+
+    def collect(result):
+        nonlocal rows
+        encoded, shard_rows, pid, seconds = result
+        writer.write(encoded)
+        stats.record(pid, shard_rows, seconds)
+        rows += shard_rows
+        elapsed = time.perf_counter() - started
+        print(f"Scored {rows} applicants ({rows / elapsed:,.0f} rows/s)", file=sys.stderr)
+
+    load_backends(chunk_size)
+    with ChunkWriter(output_path) as writer:
+        if workers <= 1:
+            init_worker(jitter_mode)
+            for shard in read_shards(input_path, chunk_size):
+                collect(score_shard(shard, parquet_output))
+        else:
+            with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(jitter_mode, True)) as pool:
+                # Futures are collected oldest first, which keeps the output in input order
+                in_flight = deque()
+                for shard in read_shards(input_path, chunk_size):
+                    if len(in_flight) >= workers * SHARDS_IN_FLIGHT_PER_WORKER:
+                        collect(in_flight.popleft().result())
+                    in_flight.append(pool.submit(score_shard, shard, parquet_output))
+                while in_flight:
+                    collect(in_flight.popleft().result())
+
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {rows} scores to {output_path} in {elapsed:.1f}s "
+          f"({rows / elapsed if elapsed else 0:,.0f} rows/s, {len(stats.rows)} worker(s))")
+    stats.report()
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input', help='applicant extract (.csv or .parquet) or feature store directory')
+    parser.add_argument('output', help='scores file (.csv or .parquet)')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='rows per shard')
+    parser.add_argument('--workers', type=int, default=available_cpus(),
+                        help='scoring processes (default: one per CPU core)')
+    parser.add_argument('--jitter', choices=predict.JITTER_MODES, default=predict.JITTER_MODE,
+                        help='jitter mode for the rule-based scorers (default: CARDIALINK_JITTER_MODE or random)')
+    args = parser.parse_args()
+    score_file(args.input, args.output, args.chunk_size, args.workers, args.jitter)
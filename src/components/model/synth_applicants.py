@@ -0,0 +1,237 @@
+"""
+Generate synthetic applicant extracts for scaling and benchmark runs.
+
+heart_disease_data.csv (303 rows) and kidney_disease.csv (400 rows) are far
+too small to load the batch scorer, so this fits a Gaussian copula to them
+and samples as many applicants as needed. Each column keeps its empirical
+distribution (coded and other few-valued columns only take values seen in
+the data, continuous ones keep the precision they are recorded with, and
+missing values appear at the rate they do in the data), and the rank
+correlations within each assessment are kept as well. The two files come
+from different patients, so the assessments are linked only through the
+applicant's age: one age is drawn per applicant (from the heart data) and
+the kidney features are correlated with it as they are with age in the
+kidney data. The diabetes form asks about symptoms that none of the bundled
+data records (the BRFSS extract `m` trains on has a different schema and is
+not in the repository), so its symptoms are drawn independently at the
+rates in DIABETES_SYMPTOM_RATES, with the applicant's age and sex.
+
+Rows are written in the score_batch.py input format, chunk by chunk, so
+memory stays flat for any row count. The same --seed and --chunk-size
+always produce the same rows. Run this from the model directory:
+
+    python synth_applicants.py applicants.parquet --rows 5000000 [--seed 0] [--chunk-size 250000]
+
+Parquet output needs pyarrow; any other extension is written as CSV.
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr, ndtri
+
+import columnar_io
+import predict
+from train_kidney import CATEGORY_CODES
+
+HEART_DATA = 'heart_disease_data.csv'
+KIDNEY_DATA = 'kidney_disease.csv'
+
+ID_COLUMN = 'applicant_id'
+
+# Most decimal places kept for a continuous column
+MAX_DECIMALS = 3
+
+# Columns with at most this many distinct values are sampled as categories, not interpolated
+MAX_LEVELS = 10
+
+# Share of applicants reporting each diabetes symptom. These are assumptions
+# for load testing, not fitted rates; adjust them if a more realistic mix is needed.
+DIABETES_SYMPTOM_RATES = {
+    'polyuria': 0.12,
+    'polydipsia': 0.10,
+    'sudden_weight_loss': 0.06,
+    'weakness': 0.25,
+    'polyphagia': 0.10,
+    'genital_thrush': 0.05,
+    'visual_blurring': 0.12,
+    'itching': 0.15,
+    'irritability': 0.10,
+    'delayed_healing': 0.08,
+}
+
+
+def normal_scores(values):
+    """Map the non-missing values of a column to standard normal scores through their ranks."""
+    ranks = pd.Series(values).rank(method='average')
+    return ndtri(ranks / (ranks.count() + 1)).to_numpy()
+
+
+def nearest_correlation(corr, floor=1e-6):
+    """Clip the eigenvalues of a pairwise-estimated correlation matrix so it is positive definite."""
+    corr = np.nan_to_num(corr)
+    values, vectors = np.linalg.eigh((corr + corr.T) / 2)
+    corr = (vectors * np.maximum(values, floor)) @ vectors.T
+    scale = np.sqrt(np.diag(corr))
+    return corr / np.outer(scale, scale)
+
+
+class Marginal:
+    """Empirical distribution of one column, sampled by inverse CDF from uniforms."""
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        observed = np.sort(values[~np.isnan(values)])
+        if len(observed) == 0:
+            raise ValueError("Cannot fit a column with no values")
+        self.sorted = observed
+        self.missing_rate = 1.0 - len(observed) / len(values)
+        # Interpolated values are rounded to the precision the column is recorded with
+        self.decimals = next((d for d in range(MAX_DECIMALS) if np.allclose(observed, np.round(observed, d))),
+                             MAX_DECIMALS)
+        self.integer = self.decimals == 0
+        # Codes and other few-valued columns (e.g. specific gravity) only take values seen in the data
+        self.discrete = self.integer or len(np.unique(observed)) <= MAX_LEVELS
+
+    def sample(self, u):
+        n = len(self.sorted)
+        if self.discrete:
+            # Each observed value keeps its empirical frequency
+            return self.sorted[np.minimum((u * n).astype(np.int64), n - 1)]
+        return np.round(np.interp(u * (n - 1), np.arange(n), self.sorted), self.decimals)
+
+
+class ApplicantModel:
+    """
+    Gaussian copula over the heart and kidney features, plus independent
+    diabetes symptoms. Build it with ApplicantModel.fit().
+    """
+
+    def __init__(self, columns, marginals, corr, age_copies):
+        self.columns = columns        # output column for each latent dimension
+        self.marginals = marginals
+        self.chol = np.linalg.cholesky(corr)
+        self.age_copies = age_copies  # output columns that repeat a latent column (age, sex)
+
+    @classmethod
+    def fit(cls, heart_path=HEART_DATA, kidney_path=KIDNEY_DATA):
+        heart = pd.read_csv(heart_path, encoding='utf-8-sig')[predict.HEART_FEATURE_NAMES]
+        heart = heart.apply(pd.to_numeric, errors='coerce')
+        kidney = pd.read_csv(kidney_path)[predict.KIDNEY_FEATURE_NAMES]
+        for column, codes in CATEGORY_CODES.items():
+            kidney[column] = kidney[column].str.strip().map(codes)
+        kidney = kidney.apply(pd.to_numeric, errors='coerce')
+
+        heart_corr = nearest_correlation(heart.apply(normal_scores).corr().to_numpy())
+        kidney_corr = nearest_correlation(kidney.apply(normal_scores).corr().to_numpy())
+
+        # Joint latent layout: every heart column, then the kidney columns except
+        # age. The kidney features depend on the other assessments only through
+        # age, so their cross-correlation is corr(heart_i, age) * corr(age, kidney_j).
+        h_age = predict.HEART_FEATURE_NAMES.index('age')
+        k_age = predict.KIDNEY_FEATURE_NAMES.index('age')
+        k_rest = [j for j in range(len(predict.KIDNEY_FEATURE_NAMES)) if j != k_age]
+        nh = len(predict.HEART_FEATURE_NAMES)
+        corr = np.eye(nh + len(k_rest))
+        corr[:nh, :nh] = heart_corr
+        corr[nh:, nh:] = kidney_corr[np.ix_(k_rest, k_rest)]
+        cross = np.outer(heart_corr[:, h_age], kidney_corr[k_age, k_rest])
+        corr[:nh, nh:] = cross
+        corr[nh:, :nh] = cross.T
+
+        columns = ([f'heart_{name}' for name in predict.HEART_FEATURE_NAMES]
+                   + [f'kidney_{predict.KIDNEY_FEATURE_NAMES[j]}' for j in k_rest])
+        marginals = ([Marginal(heart[name]) for name in predict.HEART_FEATURE_NAMES]
+                     + [Marginal(kidney[predict.KIDNEY_FEATURE_NAMES[j]]) for j in k_rest])
+        # Age and sex are answered once per applicant and repeated on every form
+        marginals[h_age].missing_rate = 0.0
+        marginals[predict.HEART_FEATURE_NAMES.index('sex')].missing_rate = 0.0
+        age_copies = {'kidney_age': 'heart_age', 'diabetes_age': 'heart_age', 'diabetes_gender': 'heart_sex'}
+        return cls(columns, marginals, nearest_correlation(corr), age_copies)
+
+    def output_columns(self):
+        """Column order of the generated frames (the score_batch.py input columns)."""
+        return [ID_COLUMN] + [f'{prefix}_{name}' for prefix, names in (
+            ('heart', predict.HEART_FEATURE_NAMES),
+            ('kidney', predict.KIDNEY_FEATURE_NAMES),
+            ('diabetes', predict.DIABETES_FEATURE_NAMES),
+        ) for name in names]
+
+    def sample(self, n, rng, first_id=0, missing=True):
+        """
+        Draw n applicants as a DataFrame in the score_batch.py input format.
+
+        Integer-coded columns use pandas' nullable Int64, so CSV output has
+        no trailing '.0' and missing values are written as empty fields.
+        """
+        z = rng.standard_normal((n, len(self.columns))) @ self.chol.T
+        u = ndtr(z)
+        data = {ID_COLUMN: np.arange(first_id, first_id + n, dtype=np.int64)}
+        for k, (column, marginal) in enumerate(zip(self.columns, self.marginals)):
+            values = marginal.sample(u[:, k])
+            if missing and marginal.missing_rate:
+                values[rng.random(n) < marginal.missing_rate] = np.nan
+            data[column] = pd.array(values, dtype='Int64') if marginal.integer else values
+        for column, source in self.age_copies.items():
+            data[column] = data[source]
+        for name, rate in DIABETES_SYMPTOM_RATES.items():
+            data[f'diabetes_{name}'] = (rng.random(n) < rate).astype(np.int64)
+        return pd.DataFrame(data)[self.output_columns()]
+
+
+def iter_applicants(rows, seed=0, chunk_size=250000, model=None, missing=True):
+    """
+    Yield DataFrames of synthetic applicants, rows in total, at most chunk_size at a time.
+
+    Chunk i is drawn from its own generator seeded with (seed, i), so a chunk
+    can be regenerated without producing the ones before it.
+    """
+    model = model or ApplicantModel.fit()
+    for index, start in enumerate(range(0, rows, chunk_size)):
+        rng = np.random.default_rng([seed, index])
+        yield model.sample(min(chunk_size, rows - start), rng, first_id=start, missing=missing)
+
+
+def applicant_matrices(rows, seed=0):
+    """
+    (heart, kidney, diabetes) float matrices for rows synthetic applicants,
+    with missing values filled by the form defaults as score_batch.py does.
+    """
+    import score_batch
+    chunk = ApplicantModel.fit().sample(rows, np.random.default_rng([seed, 0]))
+    return score_batch.chunk_matrices(chunk)[1]
+
+
+def write_applicants(output_path, rows, seed=0, chunk_size=250000, missing=True):
+    model = ApplicantModel.fit()
+    written = 0
+    if columnar_io.is_parquet(output_path):
+        import pyarrow as pa
+        schema = None
+        with columnar_io.ParquetAppender(output_path) as appender:
+            for chunk in iter_applicants(rows, seed, chunk_size, model, missing):
+                table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                schema = table.schema
+                appender.write(table)
+                written += len(chunk)
+                print(f"Generated {written} applicants", file=sys.stderr)
+    else:
+        with open(output_path, 'w', newline='') as f:
+            for chunk in iter_applicants(rows, seed, chunk_size, model, missing):
+                chunk.to_csv(f, index=False, header=(written == 0))
+                written += len(chunk)
+                print(f"Generated {written} applicants", file=sys.stderr)
+    print(f"Wrote {written} synthetic applicants to {output_path}")
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('output', help='output file (.parquet or .csv)')
+    parser.add_argument('--rows', type=int, default=1000000, help='applicants to generate')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--chunk-size', type=int, default=250000, help='rows generated and written at a time')
+    parser.add_argument('--complete', action='store_true', help='do not leave any values missing')
+    args = parser.parse_args()
+    write_applicants(args.output, args.rows, args.seed, args.chunk_size, missing=not args.complete)
@@ -1,9 +1,41 @@
 import numpy as np
 import pandas as pd
-import tensorflow as tf
 from joblib import load
 import json
 
+from predict import HEART_FEATURE_NAMES, NumpyHeartNetwork
+from export_heart import fold_scaler
+
+# Check that folding the scaler into the first layer (export_heart.py) gives
+# the same network as scaling first. Random Dense weights and scaler
+# statistics are used, so this runs without TensorFlow or any model files.
+FOLD_TOLERANCE = 1e-12
+
+print("--- Scaler Folding Parity ---")
+rng = np.random.default_rng(0)
+layer_sizes = [len(HEART_FEATURE_NAMES), 16, 8, 1]
+random_layers = [(rng.normal(size=(n_in, n_out)), rng.normal(size=n_out), activation)
+                 for n_in, n_out, activation in zip(layer_sizes[:-1], layer_sizes[1:], ['relu', 'relu', 'sigmoid'])]
+random_mean = rng.uniform(0, 250, len(HEART_FEATURE_NAMES))
+random_scale = rng.uniform(0.5, 50, len(HEART_FEATURE_NAMES))
+raw_features = random_mean + random_scale * rng.normal(size=(1000, len(HEART_FEATURE_NAMES)))
+
+folded = NumpyHeartNetwork(fold_scaler(random_layers, random_mean, random_scale), None, None, HEART_FEATURE_NAMES)
+unfused = NumpyHeartNetwork(random_layers, random_mean, random_scale, HEART_FEATURE_NAMES)
+fold_diff = np.abs(folded.predict_proba(raw_features) - unfused.predict_proba(raw_features)).max()
+print(f"Rows compared: {len(raw_features)}, max |unfused - folded|: {fold_diff:.2e}")
+if fold_diff > FOLD_TOLERANCE:
+    print(f"FAILED: difference exceeds {FOLD_TOLERANCE}")
+    exit(1)
+print("Folded network matches the unfused pipeline")
+
+# The checks below need TensorFlow and the trained model files
+try:
+    import tensorflow as tf
+except ImportError:
+    print("\nSkipping the Keras model checks, TensorFlow is not installed")
+    exit(0)
+
 # Load the model, scaler, and feature names
 try:
     model = tf.keras.models.load_model('heart_disease_model.h5')
@@ -17,8 +49,8 @@ try:
     print("Feature names loaded successfully!")
     
 except Exception as e:
-    print(f"Error loading model assets: {e}")
-    exit(1)
+    print(f"\nSkipping the Keras model checks, could not load the model assets: {e}")
+    exit(0)
 
 # Sample data for testing (values taken from the dataset)
 # This is a sample with heart disease
@@ -81,4 +113,33 @@ print(f"Probability: {prob_positive:.4f} - Risk: {'High' if prob_positive > 0.5
 
 print("Sample 2 (Expected negative): ", end="")
 prob_negative = predict_heart_disease(sample_negative)
-print(f"Probability: {prob_negative:.4f} - Risk: {'High' if prob_negative > 0.5 else 'Low'}") 
\ No newline at end of file
+print(f"Probability: {prob_negative:.4f} - Risk: {'High' if prob_negative > 0.5 else 'Low'}") 
+# Check that the NumPy backend exported by export_heart.py (with the scaler
+# folded into the first layer) reproduces the unfused scaler + network pipeline
+PARITY_TOLERANCE = 1e-5
+
+print("\n--- NumPy Backend Parity ---")
+try:
+    from export_heart import dense_layers
+    numpy_model = NumpyHeartNetwork.from_file('heart_model.npz')
+except Exception as e:
+    print(f"Skipping parity check, could not load heart_model.npz: {e}")
+else:
+    heart_data = pd.read_csv('heart_disease_data.csv', encoding='utf-8-sig')
+    parity_features = heart_data[feature_names].to_numpy(dtype=float)
+    serving_prob = numpy_model.predict_proba(parity_features)
+    
+    # Unfused references: scaler.transform followed by Keras, and by the same
+    # Dense weights evaluated in NumPy
+    unfused_model = NumpyHeartNetwork(dense_layers(model), scaler.mean_, scaler.scale_, feature_names)
+    references = {
+        'Keras': model.predict(scaler.transform(parity_features), verbose=0)[:, 0],
+        'unfused NumPy': unfused_model.predict_proba(parity_features),
+    }
+    for name, reference in references.items():
+        max_diff = np.abs(reference - serving_prob).max()
+        print(f"Rows compared: {len(parity_features)}, max |{name} - serving|: {max_diff:.2e}")
+        if max_diff > PARITY_TOLERANCE:
+            print(f"FAILED: difference exceeds {PARITY_TOLERANCE}")
+            exit(1)
+    print("NumPy backend matches the unfused pipeline")
@@ -0,0 +1,119 @@
+"""
+Train the kidney disease RandomForest and save it as a versioned artifact.
+
+predict.py loads the model instead of training it on import, so every
+worker serves the same model. Besides the pickled forest, the flattened
+CompiledForest arrays are written to a directory of .npy files, which
+predict.py memory-maps without importing scikit-learn. Run this from the
+model directory whenever kidney_disease.csv or the training parameters
+change:
+
+    python train_kidney.py [--data kidney_disease.csv] [--output kidney_model.joblib]
+                           [--forest-output kidney_model.forest]
+
+The data may also be a Parquet file (see columnar_io.py); either way only
+the model features and the label are read.
+"""
+import argparse
+import hashlib
+import json
+import time
+
+import pandas as pd
+import sklearn
+from joblib import dump
+from sklearn.ensemble import RandomForestClassifier
+
+from columnar_io import read_table
+from predict import CompiledForest
+
+# Bump when the layout of the saved artifact changes (must match predict.py)
+ARTIFACT_FORMAT = 1
+
+# Features passed to the model by predict.py, in order
+KIDNEY_MODEL_FEATURES = ['age', 'bp', 'al', 'su', 'rbc', 'pc', 'pcc', 'ba', 'bgr', 'bu', 'sc']
+
+# Encoding of the categorical columns, matching the values posted by the /kidney form
+CATEGORY_CODES = {
+    'rbc': {'normal': 0, 'abnormal': 1},
+    'pc': {'normal': 0, 'abnormal': 1},
+    'pcc': {'notpresent': 0, 'present': 1},
+    'ba': {'notpresent': 0, 'present': 1},
+}
+
+MODEL_PARAMS = {'n_estimators': 20, 'random_state': 42}
+
+
+def load_training_data(path):
+    """Read and clean kidney_disease.csv, returning (X, y) for KIDNEY_MODEL_FEATURES."""
+    kidney_data = read_table(path, columns=KIDNEY_MODEL_FEATURES + ['classification'])
+
+    # Rename columns for consistency
+    kidney_data.columns = [col.strip().lower().replace(" ", "_") for col in kidney_data.columns]
+
+    # Fix inconsistent labels and convert target labels to numerical values
+    labels = kidney_data['classification'].str.strip()
+    kidney_data['classification'] = labels.map({'ckd': 1, 'notckd': 0})
+
+    # Encode categorical columns the same way as the form does
+    for column, codes in CATEGORY_CODES.items():
+        kidney_data[column] = kidney_data[column].str.strip().map(codes)
+
+    # Convert the remaining columns to numeric, coercing errors, and drop incomplete rows
+    kidney_df = kidney_data[KIDNEY_MODEL_FEATURES + ['classification']]
+    kidney_df = kidney_df.apply(pd.to_numeric, errors='coerce').dropna(axis=0)
+    kidney_df = kidney_df.reset_index(drop=True)
+
+    X = kidney_df[KIDNEY_MODEL_FEATURES].to_numpy(dtype='float64')
+    y = kidney_df['classification'].to_numpy(dtype='int64')
+    return X, y
+
+
+def model_version(X, y):
+    """Version string derived from the training data and parameters."""
+    digest = hashlib.sha256()
+    digest.update(X.tobytes())
+    digest.update(y.tobytes())
+    digest.update(json.dumps(MODEL_PARAMS, sort_keys=True).encode())
+    digest.update(sklearn.__version__.encode())
+    return digest.hexdigest()[:12]
+
+
+def train(data_path, output_path, forest_path):
+    X, y = load_training_data(data_path)
+    if len(X) == 0:
+        raise ValueError(f"No complete rows in {data_path}")
+    print(f"Training on {len(X)} rows, {X.shape[1]} features")
+
+    model = RandomForestClassifier(**MODEL_PARAMS)
+    model.fit(X, y)
+
+    artifact = {
+        'format': ARTIFACT_FORMAT,
+        'version': model_version(X, y),
+        'features': KIDNEY_MODEL_FEATURES,
+        'sklearn_version': sklearn.__version__,
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'model': model,
+    }
+    # Uncompressed, so unpickling does not have to decompress the trees first
+    dump(artifact, output_path, compress=0)
+    print(f"Kidney model {artifact['version']} saved to {output_path}")
+    
+    # The flattened arrays predict.py serves from, memory-mapped without scikit-learn
+    CompiledForest.from_sklearn(model).save(forest_path, version=artifact['version'],
+                                            features=KIDNEY_MODEL_FEATURES,
+                                            sklearn_version=sklearn.__version__,
+                                            trained_at=artifact['trained_at'])
+    print(f"Compiled forest saved to {forest_path}")
+    return artifact
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data', default='kidney_disease.csv', help='training data (.csv or .parquet)')
+    parser.add_argument('--output', default='kidney_model.joblib', help='artifact path')
+    parser.add_argument('--forest-output', default='kidney_model.forest',
+                        help='directory for the compiled forest arrays served by predict.py')
+    args = parser.parse_args()
+    train(args.data, args.output, args.forest_output)